@@ -7,29 +7,301 @@ Compatible con Jellyfin, Plex, Emby
 
 import os
 import sys
+import errno
 import re
 import shutil
 import logging
+import logging.handlers
+import queue
 import yaml
 import json
-import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
 from pathlib import Path
 from datetime import datetime
 from typing import Dict, List, Optional
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import functools
 import hashlib
+import mmap
+import threading
+import atexit
+
+try:
+    from yaml import CSafeLoader as SafeLoader  # Parser C (libyaml)
+except ImportError:
+    from yaml import SafeLoader
+
+try:
+    import blake3  # Opcional: hash SIMD multihilo
+except ImportError:
+    blake3 = None
+
+try:
+    import xxhash  # Opcional: hash no criptográfico SIMD (xxh3)
+except ImportError:
+    xxhash = None
+
+try:
+    import re2  # Opcional: motor de regex de tiempo lineal (Google RE2)
+except ImportError:
+    re2 = None
+
+# Tamaño de bloque para hashear archivos de video grandes
+HASH_CHUNK_SIZE = 4 * 1024 * 1024
+
+# Bytes leídos al inicio y al final del archivo para la huella rápida
+QUICK_HASH_SPAN = 4 * 1024 * 1024
+
+# Hilos por defecto para el trabajo por archivo (stat, movimientos): es
+# I/O, no CPU. Se puede cambiar con settings.workers
+MAX_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+# Patrones a remover del título, unidos en una sola alternancia compilada
+_CLEAN_PATTERNS = (
+    r'\b(1080p|2160p|4K|720p|480p|UHD|HDR|HDR10|HDR10\+|DV|Dolby.?Vision)\b',
+    r'\b(WEB-?DL|BluRay|BDRip|REMUX|WEBRip|HDTS|BD|BDRIP|DVD-?Rip)\b',
+    r'\b(DD5\.1|DDP5\.1|TrueHD|Atmos|AC3|AAC|5\.1|7\.1|2\.0|DTS)\b',
+    r'\b(H\.?264|H\.?265|x264|x265|HEVC|AVC|10bit|8bit)\b',
+    r'\b(DUAL|Latino|English|Español|Castellano|Multi|Subs?)\b',
+    r'\b(AMZN|NF|ATVP|APTV|DSNP|MA|HBO|HMAX|HULU|ChileBT)\b',
+    r'\b(EXTENDED|UNRATED|Uncut|REMASTERED|IMAX|CLEAN|LINE|Full)\b',
+    r'\b(Director.?s?.?Cut|Theatrical|Special.?Edition)\b',
+    r'-[A-Z0-9]{2,}$',
+    r'\[.*?\]',
+    r'\([^()]*?(Blu-?ray|WEB|REMUX)[^()]*\)',
+)
+_CLEAN_EXPR = '|'.join(f'(?:{p})' for p in _CLEAN_PATTERNS)
+_CLEAN_RE = re.compile(_CLEAN_EXPR, re.IGNORECASE)
+# El \b de RE2 solo conoce ASCII ("Mañana" perdería "Ma" por \bMA\b), así
+# que RE2 se usa solo con nombres ASCII, donde da lo mismo que re
+_CLEAN_RE2 = re2.compile('(?i)' + _CLEAN_EXPR) if re2 is not None else None
+_SPACES_RE = re.compile(r'\s+')
+
+# MO_DEBUG_REGEX=1 aplica los patrones uno a uno, como antes de unirlos,
+# para comparar resultados con la alternancia
+_DEBUG_REGEX = bool(os.environ.get('MO_DEBUG_REGEX'))
+_PUNCT_TABLE = str.maketrans('._-', '   ')
+
+# Caracteres no permitidos en nombres de carpeta
+_INVALID_CHARS_TABLE = str.maketrans('', '', '<>:"/\\|?*')
+
+# Año dentro de un nombre de serie (para tvshow.nfo)
+_YEAR_IN_NAME = re.compile(r'\b(19|20)\d{2}\b')
+
+# Patrones para detectar episodios (orden importa: más específicos primero)
+_SERIES_PATTERNS = tuple(re.compile(p) for p in (
+    # S01E01, S1E1, etc.
+    r'[Ss](\d{1,2})[Ee](\d{1,3})',
+    # 1x01, 1x1, etc.
+    r'(\d{1,2})x(\d{1,3})',
+    # Nombre Serie 01 al final (debe ir antes del patrón general)
+    r'\s+(\d{1,3})(?:v\d+)?$',
+    # - 01 -, _01_, etc.
+    r'[\s\-_](\d{1,3})[\s\-_]',
+    # Episode 01, EP01, etc.
+    r'[Ee]pisode[\s\-_]?(\d{1,3})',
+    r'[Ee][Pp][\s\-_]?(\d{1,3})',
+))
+
+# Condiciones necesarias de cada patrón, con pruebas de caracteres baratas:
+# si fallan, el patrón no puede coincidir y se salta la regex (None = siempre)
+_SERIES_PREFILTERS = (
+    None,                                   # S01E01
+    lambda name: 'x' in name,               # 1x01
+    # Número al final ('$' también coincide antes de un salto de línea final)
+    lambda name: name[-1:].isdigit() or name.endswith('\n'),
+    None,                                   # - 01 -
+    lambda name: 'pisode' in name,          # Episode 01
+    lambda name: 'p' in name or 'P' in name,  # EP01
+)
+_SERIES_CASCADE = tuple(zip(_SERIES_PATTERNS, _SERIES_PREFILTERS))
+
+# Delimitadores alrededor de un año y su prioridad: (1999), .1999., espacios,
+# .1999 al final y espacio + 1999 al final. '' marca el final del nombre
+_YEAR_DELIMITERS = {
+    ('(', ')'): 1,
+    ('.', '.'): 2,
+    (' ', ' '): 3,
+    ('.', ''): 4,
+    (' ', ''): 5,
+}
+
+# Convierte cada dígito en '#' para localizar bloques de cuatro con str.find
+# (los '#' del propio nombre se sustituyen para que no se confundan)
+_DIGIT_SHAPE = str.maketrans('0123456789#', '#' * 10 + '_')
+
+
+# Los resultados dependen solo del nombre, así que se memoizan: los episodios
+# de una misma serie y las re-ejecuciones repiten los mismos nombres
+@functools.lru_cache(maxsize=65536)
+def _clean_title(filename: str, video_exts: tuple) -> str:
+    """Limpia el título del archivo"""
+    name = filename
+    
+    # Remover extensión (solo al final: los llamadores suelen pasar ya el stem)
+    lower = name.lower()
+    for ext in video_exts:
+        if lower.endswith(ext):
+            name = name[:-len(ext)]
+            break
+    
+    if _DEBUG_REGEX:
+        for pattern in _CLEAN_PATTERNS:
+            name = re.sub(pattern, '', name, flags=re.IGNORECASE)
+    else:
+        # Remover patrones en una sola pasada
+        if _CLEAN_RE2 is not None and name.isascii():
+            name = _CLEAN_RE2.sub('', name)
+        else:
+            name = _CLEAN_RE.sub('', name)
+    
+    # Limpiar caracteres
+    name = name.translate(_PUNCT_TABLE)
+    name = _SPACES_RE.sub(' ', name).strip()
+    
+    return name
+
+
+@functools.lru_cache(maxsize=65536)
+def _extract_year(filename: str) -> Optional[int]:
+    """Extrae el año del nombre del archivo"""
+    # Primera coincidencia de cada patrón, indexada por su prioridad
+    shape = filename.translate(_DIGIT_SHAPE)
+    length = len(filename)
+    candidates = {}
+    
+    # El año necesita un delimitador delante, así que nunca empieza en 0
+    start = shape.find('####', 1)
+    while start >= 0:
+        end = start + 4
+        if end < length and shape[end] == '#':
+            # Más de cuatro dígitos seguidos: no es un año
+            while end < length and shape[end] == '#':
+                end += 1
+            start = shape.find('####', end)
+            continue
+        
+        before = filename[start - 1]
+        after = filename[end] if end < length else ''
+        if before.isspace():
+            before = ' '
+        if after.isspace():
+            after = ' '
+        
+        priority = _YEAR_DELIMITERS.get((before, after))
+        if priority and priority not in candidates:
+            candidates[priority] = int(filename[start:end])
+        start = shape.find('####', end)
+    
+    for priority in sorted(candidates):
+        year = candidates[priority]
+        if 1900 <= year <= 2035:
+            return year
+    return None
+
+
+@functools.lru_cache(maxsize=65536)
+def _detect_series_info(filename: str, video_exts: tuple) -> Optional[Dict[str, any]]:
+    """Detecta si un archivo es una serie y extrae información"""
+    for pattern, prefilter in _SERIES_CASCADE:
+        if prefilter is not None and not prefilter(filename):
+            continue
+        match = pattern.search(filename)
+        if match:
+            groups = match.groups()
+            if len(groups) == 2:  # Tiene temporada y episodio
+                season = int(groups[0])
+                episode = int(groups[1])
+            elif len(groups) == 1:  # Solo episodio
+                season = 1
+                episode = int(groups[0])
+            else:
+                continue
+            
+            # Extraer el nombre de la serie (antes del patrón)
+            series_name = filename[:match.start()]
+            series_name = _clean_title(series_name, video_exts)
+            
+            return {
+                'series_name': series_name,
+                'season': season,
+                'episode': episode,
+                'is_series': True
+            }
+    
+    return None
+
+
+def _write_nfo(nfo_path: Path, root: str, fields: list):
+    """Escribe un NFO plano con el mismo formato que ElementTree + ET.indent
+    
+    Los NFO solo tienen un nivel de elementos con texto, así que se formatean
+    directamente sin construir el árbol
+    """
+    lines = [f"<?xml version='1.0' encoding='utf-8'?>\n<{root}>"]
+    for tag, text in fields:
+        if text:
+            lines.append(f"  <{tag}>{escape(text)}</{tag}>")
+        else:
+            lines.append(f"  <{tag} />")
+    lines.append(f"</{root}>")
+    nfo_path.write_text('\n'.join(lines), encoding='utf-8', errors='xmlcharrefreplace')
 
 
 class MediaOrganizerAutomated:
     def __init__(self, config_path: str = "config.yaml"):
         self.config = self.load_config(config_path)
         self.setup_logging()
-        self.stats = {
+        self.stats = Counter({
             'processed': 0,
             'moved': 0,
             'errors': 0,
             'duplicates': 0,
             'skipped': 0
-        }
+        })
+        self._stats_lock = threading.Lock()
+        self._local = threading.local()
+        self._folder_locks: Dict[Path, threading.Lock] = {}
+        self._folder_locks_guard = threading.Lock()
+        
+        # Ajustes de uso frecuente, leídos una sola vez
+        settings = self.config['settings']
+        self._dry_run = settings['dry_run']
+        self._copy_files = settings.get('move_or_copy', 'move') == 'copy'
+        self._transfer = self._fast_copy if self._copy_files else self._fast_move
+        self._create_nfo = bool(settings.get('create_nfo_files', False))
+        self._hash_algo = settings.get('duplicates', {}).get('hash_algo', 'xxh3')
+        self._workers = max(1, int(settings.get('workers') or MAX_WORKERS))
+        
+        # Extensiones y exclusiones, precalculadas para el recorrido
+        self._video_ext_order = tuple(settings['video_extensions'])
+        self._video_exts = frozenset(ext.lower() for ext in settings['video_extensions'])
+        self._excluded_folders = frozenset(
+            self.config.get('exclusions', {}).get('folders', [])
+        )
+        self._min_size_bytes = settings.get('min_file_size_mb', 100) * 1024 * 1024
+        
+        # Snapshot de directorios origen para find_related_files
+        self._metadata_exts = frozenset(ext.lower() for ext in settings['metadata_extensions'])
+        self._dir_cache: Dict[Path, tuple] = {}
+        self._dir_cache_lock = threading.Lock()
+        
+        # Índice perezoso de carpetas destino: {raíz: {carpeta: extensiones}}
+        self._dest_index: Dict[Path, Dict[str, Optional[set]]] = {}
+        self._dest_index_lock = threading.Lock()
+        
+        # Episodios ya presentes por carpeta de serie: {carpeta: {(T, E, ext)}}
+        self._episode_index: Dict[Path, set] = {}
+        
+        # Hashes ya calculados: {(ruta, mtime_ns, tamaño, modo): hash}
+        self._hash_cache: Dict[tuple, str] = {}
+        
+        # Carpetas destino ya creadas o verificadas en esta ejecución
+        self._created_dirs: set = set()
+        
+        # None = desconocido; process_directory lo calcula por categoría
+        self._same_fs: Optional[bool] = None
         
     def load_config(self, config_path: str) -> dict:
         """Carga la configuración desde YAML"""
@@ -38,12 +310,16 @@ class MediaOrganizerAutomated:
             raise FileNotFoundError(f"Config file not found: {config_path}")
             
         with open(config_file, 'r') as f:
-            return yaml.safe_load(f)
+            return yaml.load(f, Loader=SafeLoader)
     
     def setup_logging(self):
         """Configura el sistema de logging"""
         log_config = self.config.get('logging', {})
         
+        self.logger = logging.getLogger('MediaOrganizer')
+        self._log_listener = None
+        self._log_listener_active = False
+        
         if not log_config.get('enabled', True):
             logging.basicConfig(level=logging.WARNING)
             return
@@ -58,113 +334,86 @@ class MediaOrganizerAutomated:
             '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
         )
         
-        # Handler para archivo
-        file_handler = logging.FileHandler(log_file)
+        # Handler para archivo (rota según max_log_size_mb / backup_count)
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file,
+            maxBytes=int(log_config.get('max_log_size_mb', 10) * 1024 * 1024),
+            backupCount=log_config.get('backup_count', 5)
+        )
         file_handler.setFormatter(formatter)
         
         # Handler para consola
         console_handler = logging.StreamHandler()
         console_handler.setFormatter(formatter)
         
-        # Configurar logger
-        self.logger = logging.getLogger('MediaOrganizer')
-        self.logger.setLevel(log_level)
-        self.logger.addHandler(file_handler)
-        self.logger.addHandler(console_handler)
+        # Configurar logger: los hilos solo encolan registros y un hilo
+        # aparte se encarga del formato y la escritura
+        log_queue = queue.Queue(-1)
+        self._log_listener = logging.handlers.QueueListener(
+            log_queue, file_handler, console_handler
+        )
+        self._start_log_listener()
         
-    def clean_title(self, filename: str) -> str:
-        """Limpia el título del archivo"""
-        name = filename
-        
-        # Remover extensión
-        video_exts = self.config['settings']['video_extensions']
-        for ext in video_exts:
-            name = name.replace(ext, '')
-        
-        # Patrones a remover
-        patterns = [
-            r'\b(1080p|2160p|4K|720p|480p|UHD|HDR|HDR10|HDR10\+|DV|Dolby.?Vision)\b',
-            r'\b(WEB-?DL|BluRay|BDRip|REMUX|WEBRip|HDTS|BD|BDRIP|DVD-?Rip)\b',
-            r'\b(DD5\.1|DDP5\.1|TrueHD|Atmos|AC3|AAC|5\.1|7\.1|2\.0|DTS)\b',
-            r'\b(H\.?264|H\.?265|x264|x265|HEVC|AVC|10bit|8bit)\b',
-            r'\b(DUAL|Latino|English|Español|Castellano|Multi|Subs?)\b',
-            r'\b(AMZN|NF|ATVP|APTV|DSNP|MA|HBO|HMAX|HULU|ChileBT)\b',
-            r'\b(EXTENDED|UNRATED|Uncut|REMASTERED|IMAX|CLEAN|LINE|Full)\b',
-            r'\b(Director.?s?.?Cut|Theatrical|Special.?Edition)\b',
-            r'-[A-Z0-9]{2,}$',
-            r'\[.*?\]',
-            r'\(.*?(Blu-?ray|WEB|REMUX).*?\)',
-        ]
+        # getLogger devuelve siempre el mismo logger: si otra instancia ya lo
+        # configuró, quitar todos sus handlers en vez de duplicar cada mensaje
+        for handler in list(self.logger.handlers):
+            self.logger.removeHandler(handler)
         
-        for pattern in patterns:
-            name = re.sub(pattern, '', name, flags=re.IGNORECASE)
+        self.logger.setLevel(log_level)
+        self.logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    
+    def _start_log_listener(self):
+        """Arranca (o reanuda) el hilo que escribe los logs encolados"""
+        if self._log_listener is not None and not self._log_listener_active:
+            self._log_listener.start()
+            self._log_listener_active = True
+            # Si el llamador no usa close(), vaciar la cola al salir del
+            # proceso; close() quita el registro para no retener la instancia
+            atexit.register(self.close)
+    
+    def close(self):
+        """Escribe los logs pendientes y detiene su hilo (un nuevo run() lo reanuda)"""
+        if self._log_listener_active:
+            atexit.unregister(self.close)
+            self._log_listener.stop()
+            self._log_listener_active = False
         
-        # Limpiar caracteres
-        name = name.replace('.', ' ').replace('_', ' ').replace('-', ' ')
-        name = re.sub(r'\s+', ' ', name).strip()
+    def _count(self, key: str):
+        """Incrementa una estadística de forma segura entre hilos"""
+        # Dentro del pool cada tarea suma en su propio Counter, sin locks
+        local_stats = getattr(self._local, 'stats', None)
+        if local_stats is not None:
+            local_stats[key] += 1
+            return
         
-        return name
+        with self._stats_lock:
+            self.stats[key] += 1
+    
+    def _folder_lock(self, folder: Path) -> threading.Lock:
+        """Devuelve el lock asociado a una carpeta destino"""
+        with self._folder_locks_guard:
+            return self._folder_locks.setdefault(folder, threading.Lock())
+    
+    def _ensure_dir(self, folder: Path):
+        """Crea una carpeta destino solo la primera vez que se necesita"""
+        # Cada carpeta se crea bajo su _folder_lock, así que no hace falta otro lock
+        if folder not in self._created_dirs:
+            folder.mkdir(parents=True, exist_ok=True)
+            self._created_dirs.add(folder)
+    
+    def clean_title(self, filename: str) -> str:
+        """Limpia el título del archivo"""
+        return _clean_title(filename, self._video_ext_order)
     
     def extract_year(self, filename: str) -> Optional[int]:
         """Extrae el año del nombre del archivo"""
-        patterns = [
-            r'\((\d{4})\)',
-            r'\.(\d{4})\.',
-            r'\s(\d{4})\s',
-            r'\.(\d{4})$',
-            r'\s(\d{4})$',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, filename)
-            if match:
-                year = int(match.group(1))
-                if 1900 <= year <= 2035:
-                    return year
-        return None
+        return _extract_year(filename)
     
     def detect_series_info(self, filename: str) -> Optional[Dict[str, any]]:
         """Detecta si un archivo es una serie y extrae información"""
-        # Patrones para detectar episodios (orden importa: más específicos primero)
-        patterns = [
-            # S01E01, S1E1, etc.
-            r'[Ss](\d{1,2})[Ee](\d{1,3})',
-            # 1x01, 1x1, etc.
-            r'(\d{1,2})x(\d{1,3})',
-            # Nombre Serie 01 al final (debe ir antes del patrón general)
-            r'\s+(\d{1,3})(?:v\d+)?$',
-            # - 01 -, _01_, etc.
-            r'[\s\-_](\d{1,3})[\s\-_]',
-            # Episode 01, EP01, etc.
-            r'[Ee]pisode[\s\-_]?(\d{1,3})',
-            r'[Ee][Pp][\s\-_]?(\d{1,3})',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, filename)
-            if match:
-                groups = match.groups()
-                if len(groups) == 2:  # Tiene temporada y episodio
-                    season = int(groups[0])
-                    episode = int(groups[1])
-                elif len(groups) == 1:  # Solo episodio
-                    season = 1
-                    episode = int(groups[0])
-                else:
-                    continue
-                
-                # Extraer el nombre de la serie (antes del patrón)
-                series_name = filename[:match.start()]
-                series_name = self.clean_title(series_name)
-                
-                return {
-                    'series_name': series_name,
-                    'season': season,
-                    'episode': episode,
-                    'is_series': True
-                }
-        
-        return None
+        info = _detect_series_info(filename, self._video_ext_order)
+        # Copia: el diccionario cacheado se comparte entre llamadas
+        return dict(info) if info else None
     
     def create_tvshow_nfo(self, series_name: str, dest_folder: Path) -> bool:
         """Crea archivo tvshow.nfo para la serie"""
@@ -175,32 +424,23 @@ class MediaOrganizerAutomated:
             if nfo_path.exists():
                 return True
             
-            # Crear estructura XML
-            tvshow = ET.Element('tvshow')
-            
-            title = ET.SubElement(tvshow, 'title')
-            title.text = series_name
-            
-            plot = ET.SubElement(tvshow, 'plot')
-            plot.text = f"Serie de anime: {series_name}"
+            fields = [
+                ('title', series_name),
+                ('plot', f"Serie de anime: {series_name}"),
+            ]
             
             # Agregar año si se detecta
-            year_match = re.search(r'\b(19|20)\d{2}\b', series_name)
+            year_match = _YEAR_IN_NAME.search(series_name)
             if year_match:
-                year_elem = ET.SubElement(tvshow, 'year')
-                year_elem.text = year_match.group(0)
-                premiered = ET.SubElement(tvshow, 'premiered')
-                premiered.text = f"{year_match.group(0)}-01-01"
+                fields.append(('year', year_match.group(0)))
+                fields.append(('premiered', f"{year_match.group(0)}-01-01"))
             
-            genre = ET.SubElement(tvshow, 'genre')
-            genre.text = "Anime"
+            fields.append(('genre', "Anime"))
             
-            # Crear árbol y escribir
-            tree = ET.ElementTree(tvshow)
-            ET.indent(tree, space="  ")
-            tree.write(nfo_path, encoding='utf-8', xml_declaration=True)
+            _write_nfo(nfo_path, 'tvshow', fields)
             
-            self.logger.debug(f"Creado tvshow.nfo para {series_name}")
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug(f"Creado tvshow.nfo para {series_name}")
             return True
             
         except Exception as e:
@@ -216,77 +456,316 @@ class MediaOrganizerAutomated:
             if nfo_path.exists():
                 return True
             
-            # Crear estructura XML
-            episodedetails = ET.Element('episodedetails')
-            
-            title = ET.SubElement(episodedetails, 'title')
-            title.text = f"{series_info['series_name']} - Episodio {series_info['episode']}"
-            
-            showtitle = ET.SubElement(episodedetails, 'showtitle')
-            showtitle.text = series_info['series_name']
-            
-            season = ET.SubElement(episodedetails, 'season')
-            season.text = str(series_info['season'])
-            
-            episode = ET.SubElement(episodedetails, 'episode')
-            episode.text = str(series_info['episode'])
-            
-            plot = ET.SubElement(episodedetails, 'plot')
-            plot.text = f"Episodio {series_info['episode']} de {series_info['series_name']}"
-            
-            # Crear árbol y escribir
-            tree = ET.ElementTree(episodedetails)
-            ET.indent(tree, space="  ")
-            tree.write(nfo_path, encoding='utf-8', xml_declaration=True)
+            series_name = series_info['series_name']
+            _write_nfo(nfo_path, 'episodedetails', [
+                ('title', f"{series_name} - Episodio {series_info['episode']}"),
+                ('showtitle', series_name),
+                ('season', str(series_info['season'])),
+                ('episode', str(series_info['episode'])),
+                ('plot', f"Episodio {series_info['episode']} de {series_name}"),
+            ])
             
-            self.logger.debug(f"Creado {nfo_path.name}")
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug(f"Creado {nfo_path.name}")
             return True
             
         except Exception as e:
             self.logger.error(f"Error creando episode.nfo para {video_file.name}: {e}")
             return False
     
-    def get_file_hash(self, filepath: Path, chunk_size: int = 8192) -> str:
-        """Calcula hash MD5 de un archivo"""
-        md5 = hashlib.md5()
-        with open(filepath, 'rb') as f:
-            for chunk in iter(lambda: f.read(chunk_size), b''):
-                md5.update(chunk)
-        return md5.hexdigest()
+    def quick_fingerprint(self, filepath: Path) -> str:
+        """Huella rápida: tamaño + hash del primer y último bloque del archivo"""
+        hasher = hashlib.blake2b()
+        fd = os.open(filepath, os.O_RDONLY)
+        try:
+            size = os.fstat(fd).st_size
+            hasher.update(size.to_bytes(8, 'little'))
+            hasher.update(os.pread(fd, QUICK_HASH_SPAN, 0))
+            hasher.update(os.pread(fd, QUICK_HASH_SPAN, max(0, size - QUICK_HASH_SPAN)))
+        finally:
+            os.close(fd)
+        return hasher.hexdigest()
+    
+    def get_file_hash(self, filepath: Path, chunk_size: int = HASH_CHUNK_SIZE,
+                      mode: str = 'full') -> str:
+        """Calcula hash de un archivo según settings.duplicates.hash_algo
+        
+        'xxh3' (por defecto) usa xxhash si está instalado, si no BLAKE3 o
+        BLAKE2b; cualquier otro valor es un algoritmo de hashlib (p. ej. 'md5').
+        mode='quick' solo lee el primer y último bloque (ver quick_fingerprint).
+        El resultado se recuerda por (ruta, mtime, tamaño) durante la ejecución
+        """
+        st = os.stat(filepath)
+        key = (os.fspath(filepath), st.st_mtime_ns, st.st_size, mode)
+        digest = self._hash_cache.get(key)
+        if digest is None:
+            digest = self._hash_cache[key] = self._compute_file_hash(filepath, chunk_size, mode)
+        return digest
+    
+    def _compute_file_hash(self, filepath: Path, chunk_size: int, mode: str) -> str:
+        """Lee el archivo y calcula su hash (sin caché, ver get_file_hash)"""
+        if mode == 'quick':
+            return self.quick_fingerprint(filepath)
+        
+        algo = self._hash_algo
+        if algo == 'xxh3':
+            if xxhash is not None:
+                # Sin adversario no hace falta un hash criptográfico: xxh3
+                # consume el archivo mapeado en memoria sin bucle en Python
+                hasher = xxhash.xxh3_128()
+                with open(filepath, 'rb') as f:
+                    if os.fstat(f.fileno()).st_size:
+                        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                            hasher.update(mm)
+                return hasher.hexdigest()
+            
+            if blake3 is not None:
+                # BLAKE3 mapea el archivo en memoria y lo hashea en paralelo
+                hasher = blake3.blake3(max_threads=blake3.blake3.AUTO)
+                hasher.update_mmap(str(filepath))
+                return hasher.hexdigest()
+            
+            algo = 'blake2b'
+        
+        with open(filepath, 'rb', buffering=0) as f:
+            # Lectura secuencial: pedir al kernel read-ahead agresivo
+            if hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            
+            # Python 3.11+: bucle de lectura en C con readinto, sin doble buffer
+            if hasattr(hashlib, 'file_digest'):
+                return hashlib.file_digest(f, algo).hexdigest()
+            
+            # Versiones anteriores: mismo bucle con un buffer reutilizado
+            hasher = hashlib.new(algo)
+            buffer = bytearray(chunk_size)
+            view = memoryview(buffer)
+            while True:
+                read = f.readinto(buffer)
+                if not read:
+                    break
+                hasher.update(view[:read])
+        return hasher.hexdigest()
+    
+    def find_duplicate_files(self, files: List[Path]) -> List[List[Path]]:
+        """Agrupa archivos con contenido idéntico
+        
+        Primero agrupa por tamaño, luego compara huellas rápidas y solo
+        hashea el archivo completo cuando dos huellas coinciden
+        """
+        # Un tamaño único no puede tener duplicados: ni siquiera se abre
+        by_size: Dict[int, List[Path]] = {}
+        for filepath in files:
+            by_size.setdefault(os.stat(filepath).st_size, []).append(filepath)
+        
+        by_fingerprint: Dict[str, List[Path]] = {}
+        for same_size in by_size.values():
+            if len(same_size) < 2:
+                continue
+            for filepath in same_size:
+                fingerprint = self.get_file_hash(filepath, mode='quick')
+                by_fingerprint.setdefault(fingerprint, []).append(filepath)
+        
+        duplicates = []
+        for candidates in by_fingerprint.values():
+            if len(candidates) < 2:
+                continue
+            by_hash: Dict[str, List[Path]] = {}
+            for filepath in candidates:
+                by_hash.setdefault(self.get_file_hash(filepath), []).append(filepath)
+            duplicates.extend(group for group in by_hash.values() if len(group) > 1)
+        
+        return duplicates
+    
+    def _fast_move(self, src: Path, dst: Path):
+        """Mueve un archivo con rename o, entre discos, copiando dentro del kernel"""
+        # Si ya se sabe que origen y destino están en discos distintos, el
+        # rename fallaría siempre con EXDEV: ir directo a la copia
+        if self._same_fs is not False:
+            try:
+                os.rename(src, dst)
+                return
+            except OSError as e:
+                # En el mismo disco solo EXDEV (p. ej. un bind mount) justifica copiar
+                if self._same_fs and e.errno != errno.EXDEV:
+                    raise
+        
+        self._fast_copy(src, dst)
+        
+        # No borrar el original si la copia no quedó completa
+        if os.stat(dst).st_size != os.stat(src).st_size:
+            raise OSError(errno.EIO, "Copia incompleta, se conserva el original", str(dst))
+        os.unlink(src)
+    
+    def _fast_copy(self, src: Path, dst: Path):
+        """Copia un archivo dentro del kernel (copy_file_range) conservando metadatos"""
+        if not hasattr(os, 'copy_file_range'):
+            shutil.copy2(src, dst)
+            return
+        
+        try:
+            # copy_file_range no pasa los datos por espacio de usuario y en
+            # btrfs/XFS puede resolverse como reflink. Libera el GIL, así que
+            # cada hilo del pool mantiene su propia copia en curso
+            with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+                remaining = os.fstat(fsrc.fileno()).st_size
+                while remaining > 0:
+                    copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                    if copied == 0:
+                        break
+                    remaining -= copied
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+            # Kernel o sistema de archivos sin soporte: copia clásica
+            shutil.copy2(src, dst)
+            return
+        
+        if remaining > 0:
+            # Algunos sistemas (FUSE, overlay, procfs) devuelven 0 antes del
+            # final: no dar por buena la copia parcial y repetirla completa
+            shutil.copy2(src, dst)
+            return
+        
+        shutil.copystat(src, dst)
     
     def is_valid_video(self, filepath: Path) -> bool:
         """Verifica si es un archivo de video válido"""
-        video_exts = self.config['settings']['video_extensions']
-        min_size_mb = self.config['settings'].get('min_file_size_mb', 100)
-        
-        if filepath.suffix.lower() not in video_exts:
+        if filepath.suffix.lower() not in self._video_exts:
             return False
         
-        size_mb = filepath.stat().st_size / (1024 * 1024)
-        if size_mb < min_size_mb:
-            self.logger.debug(f"Archivo muy pequeño ({size_mb:.1f}MB): {filepath.name}")
+        size = filepath.stat().st_size
+        if size < self._min_size_bytes:
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug(f"Archivo muy pequeño ({size / (1024 * 1024):.1f}MB): {filepath.name}")
             return False
         
         return True
     
-    def find_related_files(self, video_file: Path) -> List[Path]:
-        """Encuentra archivos relacionados (subtítulos, NFO, etc)"""
-        related = []
-        base_name = video_file.stem
+    def _list_dir_files(self, parent_dir: Path) -> tuple:
+        """Archivos de metadata de un directorio como (nombre, stem)
+        
+        El directorio se lee una sola vez por ejecución y solo se guardan los
+        archivos con extensión de metadata, ya separados en nombre y stem
+        """
+        entries = self._dir_cache.get(parent_dir)
+        if entries is None:
+            metadata_exts = self._metadata_exts
+            entries = []
+            with os.scandir(parent_dir) as it:
+                for entry in it:
+                    name = entry.name
+                    # Misma regla que Path.suffix / Path.stem
+                    dot = name.rfind('.')
+                    if not 0 < dot < len(name) - 1 or name[dot:].lower() not in metadata_exts:
+                        continue
+                    if entry.is_file():
+                        entries.append((name, name[:dot]))
+            entries = self._dir_cache.setdefault(parent_dir, tuple(entries))
+        return entries
+    
+    def _claim_related_files(self, video_file: Path) -> List[Path]:
+        """Archivos relacionados de un video, reservados para moverlos
+        
+        En modo move se quitan del snapshot bajo _dir_cache_lock antes de
+        moverlos: dos videos del mismo directorio con prefijos solapados
+        (Up.2009.mkv y Up.2009.Extras.mkv) nunca se reparten el mismo archivo
+        """
+        if self._copy_files:
+            return self.find_related_files(video_file)
+        
         parent_dir = video_file.parent
+        base_name = video_file.stem
+        video_name = video_file.name
         
-        metadata_exts = self.config['settings']['metadata_extensions']
+        # La primera lectura del directorio queda fuera del lock
+        self._list_dir_files(parent_dir)
+        claimed = []
+        with self._dir_cache_lock:
+            remaining = []
+            for entry in self._dir_cache[parent_dir]:
+                name, stem = entry
+                if stem.startswith(base_name) and name != video_name:
+                    claimed.append(parent_dir / name)
+                else:
+                    remaining.append(entry)
+            if claimed:
+                self._dir_cache[parent_dir] = tuple(remaining)
+        return claimed
+    
+    def _existing_suffixes(self, destination_root: Path, folder_name: str) -> set:
+        """Extensiones (en minúsculas) de los archivos de una carpeta destino
         
-        for file in parent_dir.iterdir():
-            if file == video_file or not file.is_file():
-                continue
-            
-            # Archivos con el mismo nombre base
-            if file.stem == base_name or file.stem.startswith(base_name):
-                if file.suffix.lower() in metadata_exts:
-                    related.append(file)
+        destination_root se lee una sola vez y cada subcarpeta solo la
+        primera vez que se consulta
+        """
+        with self._dest_index_lock:
+            folders = self._dest_index.get(destination_root)
+            if folders is None:
+                try:
+                    with os.scandir(destination_root) as it:
+                        folders = {entry.name: None for entry in it if entry.is_dir()}
+                except FileNotFoundError:
+                    folders = {}
+                self._dest_index[destination_root] = folders
+        
+        if folder_name not in folders:
+            return set()
         
-        return related
+        suffixes = folders[folder_name]
+        if suffixes is None:
+            with os.scandir(destination_root / folder_name) as it:
+                suffixes = {
+                    os.path.splitext(entry.name)[1].lower() for entry in it if entry.is_file()
+                }
+            folders[folder_name] = suffixes
+        return suffixes
+    
+    def _remember_file(self, destination_root: Path, folder_name: str, suffix: str):
+        """Registra en el índice del destino un archivo recién movido"""
+        folders = self._dest_index.get(destination_root)
+        if folders is None:
+            return
+        suffixes = folders.get(folder_name)
+        if suffixes is None:
+            suffixes = folders[folder_name] = set()
+        suffixes.add(suffix.lower())
+    
+    def _existing_episodes(self, dest_folder: Path) -> set:
+        """Episodios (temporada, episodio, extensión) ya presentes en una carpeta de serie
+        
+        La carpeta se lee la primera vez que se consulta; las llamadas para una
+        misma carpeta van serializadas por su _folder_lock
+        """
+        episodes = self._episode_index.get(dest_folder)
+        if episodes is None:
+            episodes = set()
+            try:
+                with os.scandir(dest_folder) as it:
+                    for entry in it:
+                        name = entry.name
+                        dot = name.rfind('.')
+                        if dot < 0 or name[dot:].lower() not in self._video_exts:
+                            continue
+                        info = _detect_series_info(name, self._video_ext_order)
+                        if info:
+                            episodes.add((info['season'], info['episode'], name[dot:].lower()))
+            except FileNotFoundError:
+                pass
+            self._episode_index[dest_folder] = episodes
+        return episodes
+    
+    def find_related_files(self, video_file: Path) -> List[Path]:
+        """Encuentra archivos relacionados (subtítulos, NFO, etc)"""
+        parent_dir = video_file.parent
+        base_name = video_file.stem
+        video_name = video_file.name
+        
+        # Archivos con el mismo nombre base
+        return [
+            parent_dir / name for name, stem in self._list_dir_files(parent_dir)
+            if stem.startswith(base_name) and name != video_name
+        ]
     
     def organize_movie(self, video_file: Path, destination_root: Path) -> bool:
         """Organiza una película en la estructura correcta"""
@@ -301,54 +780,46 @@ class MediaOrganizerAutomated:
                 folder_name = title
             
             # Limpiar caracteres inválidos
-            folder_name = re.sub(r'[<>:"/\\|?*]', '', folder_name).strip()
+            folder_name = folder_name.translate(_INVALID_CHARS_TABLE).strip()
             
             dest_folder = destination_root / folder_name
             
-            # Verificar si ya existe
-            if dest_folder.exists():
-                existing_videos = list(dest_folder.glob('*' + video_file.suffix))
-                if existing_videos:
+            # Serializar entre hilos el trabajo sobre una misma carpeta destino
+            with self._folder_lock(dest_folder):
+                # Verificar si ya existe (índice del destino, sin glob por archivo)
+                if video_file.suffix.lower() in self._existing_suffixes(destination_root, folder_name):
                     self.logger.info(f"Ya existe: {folder_name}")
-                    self.stats['skipped'] += 1
+                    self._count('skipped')
                     return False
-            
-            # Modo dry-run
-            if self.config['settings']['dry_run']:
-                self.logger.info(f"[DRY-RUN] Movería {video_file.name} -> {dest_folder}")
-                self.stats['processed'] += 1
+                
+                # Modo dry-run
+                if self._dry_run:
+                    self.logger.info(f"[DRY-RUN] Movería {video_file.name} -> {dest_folder}")
+                    self._count('processed')
+                    return True
+                
+                # Crear carpeta destino
+                self._ensure_dir(dest_folder)
+                
+                # Mover/copiar archivo de video
+                dest_video = dest_folder / video_file.name
+                self._transfer(video_file, dest_video)
+                self._remember_file(destination_root, folder_name, video_file.suffix)
+                
+                self.logger.info(f"✓ {video_file.name} -> {folder_name}")
+                
+                # Mover archivos relacionados (solo los reservados por este video)
+                for related in self._claim_related_files(video_file):
+                    dest_related = dest_folder / related.name
+                    self._transfer(related, dest_related)
+                
+                self._count('moved')
+                self._count('processed')
                 return True
             
-            # Crear carpeta destino
-            dest_folder.mkdir(parents=True, exist_ok=True)
-            
-            # Mover/copiar archivo de video
-            dest_video = dest_folder / video_file.name
-            move_or_copy = self.config['settings'].get('move_or_copy', 'move')
-            
-            if move_or_copy == 'copy':
-                shutil.copy2(video_file, dest_video)
-            else:
-                shutil.move(str(video_file), str(dest_video))
-            
-            self.logger.info(f"✓ {video_file.name} -> {folder_name}")
-            
-            # Mover archivos relacionados
-            related_files = self.find_related_files(video_file)
-            for related in related_files:
-                dest_related = dest_folder / related.name
-                if move_or_copy == 'copy':
-                    shutil.copy2(related, dest_related)
-                else:
-                    shutil.move(str(related), str(dest_related))
-            
-            self.stats['moved'] += 1
-            self.stats['processed'] += 1
-            return True
-            
         except Exception as e:
             self.logger.error(f"Error procesando {video_file.name}: {e}")
-            self.stats['errors'] += 1
+            self._count('errors')
             return False
     
     def organize_series(self, video_file: Path, destination_root: Path) -> bool:
@@ -365,73 +836,59 @@ class MediaOrganizerAutomated:
             episode = series_info['episode']
             
             # Limpiar caracteres inválidos
-            series_name = re.sub(r'[<>:"/\\|?*]', '', series_name).strip()
+            series_name = series_name.translate(_INVALID_CHARS_TABLE).strip()
             
             # Crear estructura: Series/SeriesName/ o Series/SeriesName/Season 01/
             dest_folder = destination_root / series_name
             
-            # Verificar si ya existe el archivo
-            if dest_folder.exists():
-                # Buscar si ya existe un archivo similar
-                existing_pattern = f"*{season:02d}*{episode:02d}*{video_file.suffix}"
-                existing_files = list(dest_folder.glob(existing_pattern))
-                if not existing_files:
-                    # Buscar sin formato de ceros
-                    existing_pattern2 = f"*{season}*{episode:02d}*{video_file.suffix}"
-                    existing_files = list(dest_folder.glob(existing_pattern2))
-                
-                if existing_files:
+            # Serializar entre hilos el trabajo sobre una misma carpeta destino
+            with self._folder_lock(dest_folder):
+                # Verificar si ya existe el episodio (carpeta leída una sola vez)
+                episode_key = (season, episode, video_file.suffix.lower())
+                if episode_key in self._existing_episodes(dest_folder):
                     self.logger.info(f"Ya existe: {series_name} S{season:02d}E{episode:02d}")
-                    self.stats['skipped'] += 1
+                    self._count('skipped')
                     return False
-            
-            # Modo dry-run
-            if self.config['settings']['dry_run']:
-                nfo_msg = ""
-                if self.config['settings'].get('create_nfo_files', False):
-                    nfo_msg = " + NFO"
-                self.logger.info(f"[DRY-RUN] Movería {video_file.name} -> {dest_folder}/{nfo_msg}")
-                self.stats['processed'] += 1
+                
+                # Modo dry-run
+                if self._dry_run:
+                    nfo_msg = ""
+                    if self._create_nfo:
+                        nfo_msg = " + NFO"
+                    self.logger.info(f"[DRY-RUN] Movería {video_file.name} -> {dest_folder}/{nfo_msg}")
+                    self._count('processed')
+                    return True
+                
+                # Crear carpeta destino
+                self._ensure_dir(dest_folder)
+                
+                # Crear tvshow.nfo si está habilitado
+                if self._create_nfo:
+                    self.create_tvshow_nfo(series_name, dest_folder)
+                
+                # Mover/copiar archivo de video
+                dest_video = dest_folder / video_file.name
+                self._transfer(video_file, dest_video)
+                self._existing_episodes(dest_folder).add(episode_key)
+                
+                self.logger.info(f"✓ {video_file.name} -> {series_name}/")
+                
+                # Crear episode.nfo si está habilitado
+                if self._create_nfo:
+                    self.create_episode_nfo(video_file, series_info, dest_folder)
+                
+                # Mover archivos relacionados (solo los reservados por este video)
+                for related in self._claim_related_files(video_file):
+                    dest_related = dest_folder / related.name
+                    self._transfer(related, dest_related)
+                
+                self._count('moved')
+                self._count('processed')
                 return True
             
-            # Crear carpeta destino
-            dest_folder.mkdir(parents=True, exist_ok=True)
-            
-            # Crear tvshow.nfo si está habilitado
-            if self.config['settings'].get('create_nfo_files', False):
-                self.create_tvshow_nfo(series_name, dest_folder)
-            
-            # Mover/copiar archivo de video
-            dest_video = dest_folder / video_file.name
-            move_or_copy = self.config['settings'].get('move_or_copy', 'move')
-            
-            if move_or_copy == 'copy':
-                shutil.copy2(video_file, dest_video)
-            else:
-                shutil.move(str(video_file), str(dest_video))
-            
-            self.logger.info(f"✓ {video_file.name} -> {series_name}/")
-            
-            # Crear episode.nfo si está habilitado
-            if self.config['settings'].get('create_nfo_files', False):
-                self.create_episode_nfo(video_file, series_info, dest_folder)
-            
-            # Mover archivos relacionados
-            related_files = self.find_related_files(video_file)
-            for related in related_files:
-                dest_related = dest_folder / related.name
-                if move_or_copy == 'copy':
-                    shutil.copy2(related, dest_related)
-                else:
-                    shutil.move(str(related), str(dest_related))
-            
-            self.stats['moved'] += 1
-            self.stats['processed'] += 1
-            return True
-            
         except Exception as e:
             self.logger.error(f"Error procesando serie {video_file.name}: {e}")
-            self.stats['errors'] += 1
+            self._count('errors')
             return False
     
     def process_directory(self, category: str, source: Path, destination: Path):
@@ -446,24 +903,91 @@ class MediaOrganizerAutomated:
         
         destination.mkdir(parents=True, exist_ok=True)
         
-        # Buscar archivos de video
-        video_files = []
-        for ext in self.config['settings']['video_extensions']:
-            video_files.extend(source.rglob(f'*{ext}'))
+        # Detectar una vez si origen y destino comparten sistema de archivos
+        self._same_fs = os.stat(source).st_dev == os.stat(destination).st_dev
+        
+        # Buscar videos válidos en una sola pasada por el árbol
+        video_files = self._scan_videos(source)
         
         self.logger.info(f"  Encontrados {len(video_files)} archivos de video")
         
-        for video_file in video_files:
-            if not self.is_valid_video(video_file):
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            results = executor.map(
+                lambda video_path: self._process_one(category, video_path, destination),
+                video_files
+            )
+            # Combinar los contadores de cada tarea en el hilo principal y
+            # publicarlos en self.stats de una sola vez
+            category_stats = Counter()
+            for local_stats in results:
+                category_stats.update(local_stats)
+        
+        with self._stats_lock:
+            self.stats.update(category_stats)
+    
+    def _scan_videos(self, source: Path) -> List[str]:
+        """Recorre el árbol una vez y devuelve los videos válidos (extensión y tamaño)"""
+        video_exts = self._video_exts
+        excluded_folders = self._excluded_folders
+        min_bytes = self._min_size_bytes
+        log_debug = self.logger.isEnabledFor(logging.DEBUG)
+        
+        video_files = []
+        pending = [str(source)]
+        while pending:
+            try:
+                it = os.scandir(pending.pop())
+            except OSError:
                 continue
-            
+            with it:
+                for entry in it:
+                    name = entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        # No descender en carpetas excluidas (@eaDir, .@__thumb, ...)
+                        if name not in excluded_folders:
+                            pending.append(entry.path)
+                        continue
+                    
+                    dot = name.rfind('.')
+                    if dot < 0 or name[dot:].lower() not in video_exts or not entry.is_file():
+                        continue
+                    
+                    # El stat del DirEntry queda cacheado: sin syscall extra por archivo
+                    size = entry.stat().st_size
+                    if size < min_bytes:
+                        if log_debug:
+                            self.logger.debug(f"Archivo muy pequeño ({size / (1024 * 1024):.1f}MB): {name}")
+                        continue
+                    
+                    video_files.append(entry.path)
+        
+        return video_files
+    
+    def _process_one(self, category: str, video_path: str, destination: Path) -> Counter:
+        """Organiza un archivo de video (se ejecuta en el pool de hilos)
+        
+        Devuelve las estadísticas de la tarea para combinarlas al final
+        """
+        video_file = Path(video_path)
+        local_stats = Counter()
+        self._local.stats = local_stats
+        try:
             if category in ['movies', 'documentaries']:
                 self.organize_movie(video_file, destination)
             elif category in ['series', 'anime']:
                 self.organize_series(video_file, destination)
+        finally:
+            self._local.stats = None
+        return local_stats
     
     def run(self):
         """Ejecuta el organizador para todos los directorios configurados"""
+        # Un close() anterior pudo detener el hilo de logs
+        self._start_log_listener()
+        
+        # Los hashes solo se recuerdan dentro de una misma ejecución
+        self._hash_cache.clear()
+        
         self.logger.info("=" * 60)
         self.logger.info("Iniciando Media Library Organizer")
         self.logger.info("=" * 60)
@@ -520,6 +1044,7 @@ def main():
         print(f"Buscado en: {', '.join(config_paths)}")
         sys.exit(1)
     
+    organizer = None
     try:
         organizer = MediaOrganizerAutomated(config_file)
         organizer.run()
@@ -529,6 +1054,10 @@ def main():
     except Exception as e:
         print(f"Error fatal: {e}")
         sys.exit(1)
+    finally:
+        # Escribir los logs pendientes
+        if organizer is not None:
+            organizer.close()
 
 
 if __name__ == "__main__":
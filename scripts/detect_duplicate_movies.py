@@ -6,118 +6,200 @@ Detecta duplicados basándose en el título y año de la película.
 
 import os
 import re
+import sys
+import functools
 from pathlib import Path
 from collections import defaultdict
 import json
 
+try:
+    import orjson  # Opcional: serializador JSON en C
+except ImportError:
+    orjson = None
+
+try:
+    from rapidfuzz import fuzz, process  # Opcional: comparación difusa de títulos
+except ImportError:
+    fuzz = process = None
+
+
+# Etiquetas a remover del título, unidas en alternancias. Las plataformas y
+# palabras extras se quitan después de los grupos de release y corchetes,
+# como siempre, porque al quitar estos pueden aparecer nuevos límites de palabra
+_TAGS_RE = re.compile(
+    r'\b(1080p|2160p|4K|720p|480p|UHD|HDR|HDR10|DV'
+    r'|WEB-DL|BluRay|BDRip|REMUX|WEBRip|HDTS|BD|BDRIP'
+    r'|DD5\.1|DDP5\.1|TrueHD|Atmos|AC3|AAC|5\.1|7\.1|2\.0'
+    r'|H\.?264|H\.?265|x264|x265|HEVC'
+    r'|DUAL|Latino|English|Español|Castellano|Multi|Subs?)\b',
+    re.IGNORECASE
+)
+_EXTRA_TAGS_RE = re.compile(
+    r'\b(AMZN|NF|ATVP|APTV|DSNP|MA|HBO'
+    r'|EXTENDED|UNRATED|Uncut|REMASTERED|IMAX|CLEAN|LINE)\b',
+    re.IGNORECASE
+)
+_RELEASE_GROUP_RE = re.compile(r'-[A-Z]{2,}$', re.IGNORECASE)
+_BRACKETS_RE = re.compile(r'\[.*?\]')
+_DUAL_PAREN_RE = re.compile(r'\(.*?DUAL.*?\)', re.IGNORECASE)
+_PUNCT_TABLE = str.maketrans('._-', '   ')
+_SPACES_RE = re.compile(r'\s+')
+
+# Patrones de año en orden de prioridad: gana el primero que dé un año válido,
+# aunque otro aparezca antes en el nombre (por eso no se fusionan en uno)
+_YEAR_PATTERNS = (
+    re.compile(r'\((\d{4})\)'),  # (2024)
+    re.compile(r'\.(\d{4})\.'),  # .2024.
+    re.compile(r'\s(\d{4})\s'),  # 2024
+    re.compile(r'\.(\d{4})$'),   # .2024 al final
+)
+
+# Atributos de calidad para elegir la mejor copia
+_HDR_RE = re.compile(r'\b(HDR|HDR10|DV|Dolby Vision)\b', re.IGNORECASE)
+_AUDIO_HI_RE = re.compile(r'\b(Atmos|TrueHD|7\.1)\b', re.IGNORECASE)
+_AUDIO_51_RE = re.compile(r'\b(DD5\.1|DDP5\.1|5\.1)\b', re.IGNORECASE)
+
+# Normalización de títulos para comparar
+_ARTICLE_RE = re.compile(r'^(the|la|el|los|las|a|an)\s+')
+_NON_WORD_RE = re.compile(r'[^\w\s]')
+
+
+# Funciones puras de texto: se memoizan por nombre de archivo, así los
+# nombres repetidos (re-escaneos, varias bibliotecas) no repiten las regex
+@functools.lru_cache(maxsize=4096)
+def _clean_title(filename):
+    """Extrae y limpia el título de la película del nombre del archivo."""
+    # Remover extensión
+    name = filename.replace('.mkv', '').replace('.mp4', '').replace('.avi', '')
+    
+    # Remueve calidades, códecs y formatos, audio, códecs de video e idiomas
+    name = _TAGS_RE.sub('', name)
+    
+    # Remueve grupos de release
+    name = _RELEASE_GROUP_RE.sub('', name)
+    name = _BRACKETS_RE.sub('', name)
+    name = _DUAL_PAREN_RE.sub('', name)
+    
+    # Remueve plataformas y palabras extras
+    name = _EXTRA_TAGS_RE.sub('', name)
+    
+    # Limpia puntos, guiones y espacios múltiples
+    name = name.translate(_PUNCT_TABLE)
+    name = _SPACES_RE.sub(' ', name).strip()
+    
+    return name
+
+
+@functools.lru_cache(maxsize=4096)
+def _extract_year(filename):
+    """Extrae el año de la película."""
+    # Buscar año entre paréntesis o después del título
+    for pattern in _YEAR_PATTERNS:
+        match = pattern.search(filename)
+        if match:
+            year = int(match.group(1))
+            if 1900 <= year <= 2030:  # Validar rango razonable
+                return year
+    return None
+
+
+@functools.lru_cache(maxsize=4096)
+def _normalize_title(title):
+    """Normaliza el título para comparación."""
+    # Convertir a minúsculas
+    title = title.lower()
+    
+    # Remover artículos comunes
+    title = _ARTICLE_RE.sub('', title)
+    
+    # Remover caracteres especiales
+    title = _NON_WORD_RE.sub('', title)
+    
+    # Remover espacios múltiples
+    title = _SPACES_RE.sub(' ', title).strip()
+    
+    return title
+
+
+def _quality_score(movie):
+    """Puntuación entera para ordenar copias: mayor es mejor.
+    
+    Empaqueta en un solo int, de más a menos importante: 4K, HDR, audio
+    dual, Atmos/7.1 y por último el tamaño en bytes.
+    """
+    return (
+        (movie['quality'] == '4K') << 63
+        | movie['hdr'] << 62
+        | movie['dual_audio'] << 61
+        | (movie['audio'] == 'Atmos/7.1') << 60
+        | movie['size_bytes'] & ((1 << 60) - 1)
+    )
+
+
+def best_copy(movies):
+    """Devuelve la mejor copia sin ordenar toda la lista (la primera si empatan)."""
+    return max(movies, key=_quality_score)
+
+
+def _report_key(key):
+    """Clave (título normalizado, año) como texto "título|año" para el reporte."""
+    normalized_title, year = key
+    return f"{normalized_title}|{year}"
+
 
 class MovieDuplicateDetector:
-    def __init__(self, movies_path):
+    def __init__(self, movies_path, fuzzy_threshold=None):
         self.movies_path = Path(movies_path)
+        self.fuzzy_threshold = fuzzy_threshold
         self.movies_db = defaultdict(list)
+        # Claves con más de una copia, en el orden en que aparece la segunda
+        # (dict como conjunto ordenado: el reporte sale siempre igual)
+        self.duplicate_keys = {}
         self.duplicates = defaultdict(list)
         
     def clean_title(self, filename):
         """Extrae y limpia el título de la película del nombre del archivo."""
-        # Remover extensión
-        name = filename.replace('.mkv', '').replace('.mp4', '').replace('.avi', '')
-        
-        # Patrones comunes para limpiar
-        # Remueve calidades: 1080p, 2160p, 4K, HDR, etc.
-        name = re.sub(r'\b(1080p|2160p|4K|720p|480p|UHD|HDR|HDR10|DV)\b', '', name, flags=re.IGNORECASE)
-        
-        # Remueve códecs y formatos
-        name = re.sub(r'\b(WEB-DL|BluRay|BDRip|REMUX|WEBRip|HDTS|BD|BDRIP)\b', '', name, flags=re.IGNORECASE)
-        
-        # Remueve audio
-        name = re.sub(r'\b(DD5\.1|DDP5\.1|TrueHD|Atmos|AC3|AAC|5\.1|7\.1|2\.0)\b', '', name, flags=re.IGNORECASE)
-        
-        # Remueve códecs de video
-        name = re.sub(r'\b(H\.?264|H\.?265|x264|x265|HEVC)\b', '', name, flags=re.IGNORECASE)
-        
-        # Remueve idiomas
-        name = re.sub(r'\b(DUAL|Latino|English|Español|Castellano|Multi|Subs?)\b', '', name, flags=re.IGNORECASE)
-        
-        # Remueve grupos de release
-        name = re.sub(r'-[A-Z]{2,}$', '', name, flags=re.IGNORECASE)
-        name = re.sub(r'\[.*?\]', '', name)
-        name = re.sub(r'\(.*?DUAL.*?\)', '', name, flags=re.IGNORECASE)
-        
-        # Remueve plataformas
-        name = re.sub(r'\b(AMZN|NF|ATVP|APTV|DSNP|MA|HBO)\b', '', name, flags=re.IGNORECASE)
-        
-        # Remueve palabras extras
-        name = re.sub(r'\b(EXTENDED|UNRATED|Uncut|REMASTERED|IMAX|CLEAN|LINE)\b', '', name, flags=re.IGNORECASE)
-        
-        # Limpia puntos, guiones y espacios múltiples
-        name = name.replace('.', ' ').replace('_', ' ').replace('-', ' ')
-        name = re.sub(r'\s+', ' ', name).strip()
-        
-        return name
+        return _clean_title(filename)
     
     def extract_year(self, filename):
         """Extrae el año de la película."""
-        # Buscar año entre paréntesis o después del título
-        year_patterns = [
-            r'\((\d{4})\)',  # (2024)
-            r'\.(\d{4})\.',  # .2024.
-            r'\s(\d{4})\s',  # 2024
-            r'\.(\d{4})$',   # .2024 al final
-        ]
-        
-        for pattern in year_patterns:
-            match = re.search(pattern, filename)
-            if match:
-                year = int(match.group(1))
-                if 1900 <= year <= 2030:  # Validar rango razonable
-                    return year
-        return None
+        return _extract_year(filename)
     
     def normalize_title(self, title):
         """Normaliza el título para comparación."""
-        # Convertir a minúsculas
-        title = title.lower()
-        
-        # Remover artículos comunes
-        title = re.sub(r'^(the|la|el|los|las|a|an)\s+', '', title)
-        
-        # Remover caracteres especiales
-        title = re.sub(r'[^\w\s]', '', title)
-        
-        # Remover espacios múltiples
-        title = re.sub(r'\s+', ' ', title).strip()
-        
-        return title
+        return _normalize_title(title)
     
     def get_file_info(self, filepath):
-        """Obtiene información detallada del archivo."""
+        """Obtiene información detallada del archivo (Path o os.DirEntry)."""
         stat = filepath.stat()
+        name = filepath.name
+        upper_name = name.upper()
         
         # Detectar calidad
         quality = 'SD'
-        if '2160p' in filepath.name or '4K' in filepath.name.upper():
+        if '2160p' in name or '4K' in upper_name:
             quality = '4K'
-        elif '1080p' in filepath.name:
+        elif '1080p' in name:
             quality = '1080p'
-        elif '720p' in filepath.name:
+        elif '720p' in name:
             quality = '720p'
         
         # Detectar HDR
-        has_hdr = bool(re.search(r'\b(HDR|HDR10|DV|Dolby Vision)\b', filepath.name, re.IGNORECASE))
+        has_hdr = _HDR_RE.search(name) is not None
         
         # Detectar audio
         audio = 'Stereo'
-        if re.search(r'\b(Atmos|TrueHD|7\.1)\b', filepath.name, re.IGNORECASE):
+        if _AUDIO_HI_RE.search(name):
             audio = 'Atmos/7.1'
-        elif re.search(r'\b(DD5\.1|DDP5\.1|5\.1)\b', filepath.name, re.IGNORECASE):
+        elif _AUDIO_51_RE.search(name):
             audio = '5.1'
         
         # Detectar idioma
-        is_dual = 'DUAL' in filepath.name.upper()
+        is_dual = 'DUAL' in upper_name
         
         return {
-            'path': str(filepath),
-            'filename': filepath.name,
+            'path': os.fspath(filepath),
+            'filename': name,
             'size_bytes': stat.st_size,
             'size_gb': round(stat.st_size / (1024**3), 2),
             'quality': quality,
@@ -132,12 +214,20 @@ class MovieDuplicateDetector:
         print(f"🔍 Escaneando: {self.movies_path}")
         print("=" * 80)
         
-        # Buscar archivos .mkv sueltos
-        mkv_files = list(self.movies_path.glob('*.mkv'))
-        mp4_files = list(self.movies_path.glob('*.mp4'))
-        avi_files = list(self.movies_path.glob('*.avi'))
-        
-        all_files = mkv_files + mp4_files + avi_files
+        # Buscar archivos .mkv, .mp4 y .avi sueltos en una sola lectura del
+        # directorio; el stat de cada DirEntry queda cacheado para get_file_info
+        files_by_ext = {'.mkv': [], '.mp4': [], '.avi': []}
+        try:
+            with os.scandir(self.movies_path) as it:
+                for entry in it:
+                    # Igual que Path.glob('*.ext'): terminación exacta, ocultos incluidos
+                    same_ext = files_by_ext.get(entry.name[-4:])
+                    if same_ext is not None and entry.is_file():
+                        same_ext.append(entry)
+        except FileNotFoundError:
+            pass
+        
+        all_files = files_by_ext['.mkv'] + files_by_ext['.mp4'] + files_by_ext['.avi']
         
         print(f"📁 Archivos encontrados: {len(all_files)}")
         print()
@@ -151,11 +241,13 @@ class MovieDuplicateDetector:
                 print(f"⚠️  Sin año detectado: {filepath.name}")
                 continue
             
-            # Normalizar título para comparación
-            normalized_title = self.normalize_title(clean_title)
+            # Normalizar título para comparación; internados, las copias de
+            # una misma película comparten la cadena
+            clean_title = sys.intern(clean_title)
+            normalized_title = sys.intern(self.normalize_title(clean_title))
             
             # Crear clave única: título + año
-            key = f"{normalized_title}|{year}"
+            key = (normalized_title, year)
             
             # Obtener información del archivo
             file_info = self.get_file_info(filepath)
@@ -163,19 +255,77 @@ class MovieDuplicateDetector:
             file_info['year'] = year
             file_info['normalized_title'] = normalized_title
             
-            self.movies_db[key].append(file_info)
+            copies = self.movies_db[key]
+            copies.append(file_info)
+            if len(copies) == 2:
+                self.duplicate_keys[key] = None
         
         print(f"✅ Escaneo completado: {len(self.movies_db)} películas únicas identificadas")
         print()
     
+    def merge_similar_titles(self):
+        """Une en movies_db los títulos parecidos del mismo año (requiere rapidfuzz)."""
+        if process is None:
+            print("⚠️  rapidfuzz no está instalado: se omite la comparación difusa")
+            return
+        
+        titles_by_year = defaultdict(list)
+        for normalized_title, year in self.movies_db:
+            titles_by_year[year].append(normalized_title)
+        
+        merged = 0
+        for year, titles in titles_by_year.items():
+            if len(titles) < 2:
+                continue
+            
+            # Union-find sobre los índices de titles
+            parent = list(range(len(titles)))
+            
+            def find(i):
+                while parent[i] != i:
+                    parent[i] = parent[parent[i]]
+                    i = parent[i]
+                return i
+            
+            for i, title in enumerate(titles):
+                # token_sort_ratio tolera el orden de las palabras pero no las que
+                # sobran: token_set_ratio daba 100 a "dune" / "dune part two"
+                matches = process.extract(title, titles, scorer=fuzz.token_sort_ratio,
+                                          score_cutoff=self.fuzzy_threshold, limit=None)
+                for _, _, j in matches:
+                    root_i, root_j = find(i), find(j)
+                    if root_i != root_j:
+                        parent[max(root_i, root_j)] = min(root_i, root_j)
+            
+            clusters = defaultdict(list)
+            for i, title in enumerate(titles):
+                clusters[find(i)].append(title)
+            
+            # Cada grupo queda bajo su título menor en orden alfabético
+            for cluster in clusters.values():
+                if len(cluster) < 2:
+                    continue
+                canonical = (min(cluster), year)
+                for title in cluster:
+                    if (title, year) != canonical:
+                        self.movies_db[canonical].extend(self.movies_db.pop((title, year)))
+                        self.duplicate_keys.pop((title, year), None)
+                        merged += 1
+                self.duplicate_keys[canonical] = None
+        
+        print(f"🔗 Títulos parecidos unidos: {merged}")
+    
     def find_duplicates(self):
         """Encuentra duplicados."""
         print("🔎 Buscando duplicados...")
         print("=" * 80)
         
-        for key, movies in self.movies_db.items():
-            if len(movies) > 1:
-                self.duplicates[key] = movies
+        if self.fuzzy_threshold is not None:
+            self.merge_similar_titles()
+        
+        # scan_movies ya anotó qué claves tienen más de una copia
+        for key in self.duplicate_keys:
+            self.duplicates[key] = self.movies_db[key]
         
         print(f"🎬 Duplicados encontrados: {len(self.duplicates)} películas")
         print()
@@ -186,61 +336,59 @@ class MovieDuplicateDetector:
             print("✨ No se encontraron películas duplicadas!")
             return
         
-        print("=" * 80)
-        print("📋 REPORTE DE PELÍCULAS DUPLICADAS")
-        print("=" * 80)
-        print()
+        # Todo el reporte se acumula y se escribe de una vez al final
+        lines = []
+        append = lines.append
+        
+        append("=" * 80)
+        append("📋 REPORTE DE PELÍCULAS DUPLICADAS")
+        append("=" * 80)
+        append("")
         
         total_wasted_space = 0
         duplicate_count = 0
         
-        for key, movies in sorted(self.duplicates.items()):
+        # Mismo orden que con las antiguas claves "título|año"
+        for key, movies in sorted(self.duplicates.items(), key=lambda item: _report_key(item[0])):
             duplicate_count += 1
-            title_parts = key.split('|')
-            normalized_title = title_parts[0]
-            year = title_parts[1]
+            normalized_title, year = key
             
-            print(f"🎬 Película #{duplicate_count}: {movies[0]['clean_title']} ({year})")
-            print(f"   Copias encontradas: {len(movies)}")
-            print()
+            append(f"🎬 Película #{duplicate_count}: {movies[0]['clean_title']} ({year})")
+            append(f"   Copias encontradas: {len(movies)}")
+            append("")
             
             # Ordenar por calidad y tamaño
-            sorted_movies = sorted(movies, key=lambda x: (
-                x['quality'] != '4K',
-                not x['hdr'],
-                not x['dual_audio'],
-                x['audio'] != 'Atmos/7.1',
-                -x['size_bytes']
-            ))
-            
-            best_quality = sorted_movies[0]
+            sorted_movies = sorted(movies, key=_quality_score, reverse=True)
             
+            # La mejor versión es la primera tras ordenar
             for idx, movie in enumerate(sorted_movies, 1):
-                is_best = movie == best_quality
+                is_best = idx == 1
                 marker = "⭐ MEJOR" if is_best else "   "
                 
-                print(f"   {marker} Versión {idx}:")
-                print(f"        📄 Archivo: {movie['filename']}")
-                print(f"        💾 Tamaño: {movie['size_gb']} GB")
-                print(f"        🎥 Calidad: {movie['quality']}")
-                print(f"        ✨ HDR: {'Sí' if movie['hdr'] else 'No'}")
-                print(f"        🔊 Audio: {movie['audio']}")
-                print(f"        🌐 Dual: {'Sí' if movie['dual_audio'] else 'No'}")
-                print()
+                append(f"   {marker} Versión {idx}:")
+                append(f"        📄 Archivo: {movie['filename']}")
+                append(f"        💾 Tamaño: {movie['size_gb']} GB")
+                append(f"        🎥 Calidad: {movie['quality']}")
+                append(f"        ✨ HDR: {'Sí' if movie['hdr'] else 'No'}")
+                append(f"        🔊 Audio: {movie['audio']}")
+                append(f"        🌐 Dual: {'Sí' if movie['dual_audio'] else 'No'}")
+                append("")
                 
                 if not is_best:
                     total_wasted_space += movie['size_bytes']
             
-            print("-" * 80)
-            print()
-        
-        print("=" * 80)
-        print("📊 RESUMEN")
-        print("=" * 80)
-        print(f"Total de películas duplicadas: {len(self.duplicates)}")
-        print(f"Total de archivos duplicados: {sum(len(m) - 1 for m in self.duplicates.values())}")
-        print(f"Espacio desperdiciado: {round(total_wasted_space / (1024**3), 2)} GB")
-        print()
+            append("-" * 80)
+            append("")
+        
+        append("=" * 80)
+        append("📊 RESUMEN")
+        append("=" * 80)
+        append(f"Total de películas duplicadas: {len(self.duplicates)}")
+        append(f"Total de archivos duplicados: {sum(len(m) - 1 for m in self.duplicates.values())}")
+        append(f"Espacio desperdiciado: {round(total_wasted_space / (1024**3), 2)} GB")
+        append("")
+        
+        sys.stdout.write('\n'.join(lines) + '\n')
     
     def generate_report(self, output_file='duplicate_movies_report.json'):
         """Genera un reporte JSON con los duplicados."""
@@ -254,16 +402,21 @@ class MovieDuplicateDetector:
         }
         
         for key, movies in self.duplicates.items():
-            title_parts = key.split('|')
-            report['duplicates'][key] = {
+            report['duplicates'][_report_key(key)] = {
                 'title': movies[0]['clean_title'],
                 'year': movies[0]['year'],
+                'best': best_copy(movies)['path'],
                 'copies': movies
             }
         
         output_path = Path(output_file)
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(report, f, indent=2, ensure_ascii=False)
+        if orjson is not None:
+            # Mismo formato que json.dump(indent=2, ensure_ascii=False)
+            with open(output_path, 'wb') as f:
+                f.write(orjson.dumps(report, option=orjson.OPT_INDENT_2))
+        else:
+            with open(output_path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
         
         print(f"💾 Reporte guardado en: {output_path.absolute()}")
         print()
@@ -272,6 +425,7 @@ class MovieDuplicateDetector:
 def main():
     # Configuración
     MOVIES_PATH = "/mnt/PROD/MEDIA/Downloads/Movies"
+    FUZZY_THRESHOLD = None  # p. ej. 92 para unir títulos parecidos (requiere rapidfuzz)
     
     print("=" * 80)
     print("🎬 DETECTOR DE PELÍCULAS DUPLICADAS")
@@ -279,7 +433,7 @@ def main():
     print()
     
     # Crear detector
-    detector = MovieDuplicateDetector(MOVIES_PATH)
+    detector = MovieDuplicateDetector(MOVIES_PATH, FUZZY_THRESHOLD)
     
     # Escanear películas
     detector.scan_movies()
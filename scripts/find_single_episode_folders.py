@@ -8,27 +8,59 @@ import os
 import sys
 import yaml
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from yaml import CSafeLoader as SafeLoader  # Parser C (libyaml)
+except ImportError:
+    from yaml import SafeLoader
 
 # Extensiones de video válidas
 VIDEO_EXTENSIONS = {'.mkv', '.mp4', '.avi', '.m4v', '.mov', '.wmv', '.flv', '.webm'}
 
+# Subcarpetas recorridas en paralelo (el recorrido es I/O, no CPU)
+MAX_WORKERS = 16
+
 def load_config():
     """Cargar configuración desde config.yaml"""
     config_path = Path(__file__).parent.parent / 'config.yaml'
     if config_path.exists():
         with open(config_path, 'r') as f:
-            return yaml.safe_load(f)
+            return yaml.load(f, Loader=SafeLoader)
     return None
 
-def count_video_files(directory: Path) -> int:
-    """Contar archivos de video en un directorio (recursivo)"""
+def count_video_files(directory: Path, limit: int = None) -> int:
+    """Contar archivos de video en un directorio (recursivo)
+    
+    Con limit, deja de recorrer en cuanto el conteo supera ese valor
+    (devuelve limit + 1): basta para saber que la carpeta tiene más
+    """
     count = 0
-    try:
-        for item in directory.rglob('*'):
-            if item.is_file() and item.suffix.lower() in VIDEO_EXTENSIONS:
-                count += 1
-    except PermissionError:
-        pass
+    pending = [directory]
+    while pending:
+        # Una carpeta ilegible o que desaparece a mitad del recorrido (ENOENT,
+        # EIO, ...) solo se salta: no debe abortar el reporte completo
+        try:
+            it = os.scandir(pending.pop())
+        except OSError:
+            continue
+        try:
+            with it:
+                for entry in it:
+                    # Igual que rglob: no entrar en enlaces simbólicos a carpetas
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                        continue
+                    
+                    # Extensión sobre el nombre en bruto, sin crear un Path por archivo
+                    name = entry.name
+                    dot = name.rfind('.')
+                    if dot > 0 and name[dot:].lower() in VIDEO_EXTENSIONS and entry.is_file():
+                        count += 1
+                        if limit is not None and count > limit:
+                            return count
+        except OSError:
+            continue
     return count
 
 def find_single_episode_folders(anime_dir: str, max_files: int = 1):
@@ -56,10 +88,11 @@ def find_single_episode_folders(anime_dir: str, max_files: int = 1):
     
     results = []
     
-    # Iterar sobre subdirectorios de primer nivel
-    for subdir in sorted(anime_path.iterdir()):
-        if subdir.is_dir():
-            video_count = count_video_files(subdir)
+    # Contar en paralelo los subdirectorios de primer nivel; map conserva el orden
+    subdirs = [subdir for subdir in sorted(anime_path.iterdir()) if subdir.is_dir()]
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        counts = executor.map(lambda subdir: count_video_files(subdir, max_files), subdirs)
+        for subdir, video_count in zip(subdirs, counts):
             if 0 < video_count <= max_files:
                 results.append((subdir.name, video_count))
     
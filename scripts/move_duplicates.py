@@ -5,8 +5,12 @@ Mantiene la mejor calidad en Movies y mueve las versiones inferiores.
 """
 
 import os
+import sys
+import stat
+import errno
 import shutil
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 MOVIES_PATH = "/mnt/PROD/MEDIA/Downloads/Movies"
 DUPLICATES_PATH = "/mnt/PROD/MEDIA/Duplicados"
@@ -45,82 +49,155 @@ FULL_FOLDERS_TO_MOVE = [
     "Wonka 2023 (2023)"
 ]
 
+# Movimientos simultáneos (cada uno es latencia de I/O, no CPU)
+MAX_WORKERS = 8
+
+def move_files(executor, mover, files, dup_folder):
+    """Mover los archivos a dup_folder en paralelo
+    
+    Devuelve (movidos, fallidos) en el orden de files; fallidos son pares
+    (archivo, error). Un fallo no detiene el resto de movimientos
+    """
+    futures = {executor.submit(mover, file, dup_folder / file.name): file for file in files}
+    errors = {}
+    for future in as_completed(futures):
+        error = future.exception()
+        if error is not None:
+            errors[futures[future]] = error
+    moved = [file for file in files if file not in errors]
+    failed = [(file, errors[file]) for file in files if file in errors]
+    return moved, failed
+
+def move_file(source, target):
+    """Mover con os.replace; si la carpeta está en otro montaje (EXDEV), con shutil"""
+    try:
+        os.replace(source, target)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.move(source, target)
+
+def dir_size(directory):
+    """Tamaño total de los archivos bajo directory (recursivo)"""
+    total = 0
+    pending = [directory]
+    while pending:
+        # Igual que rglob: saltar carpetas ilegibles (@eaDir, #recycle, ...)
+        try:
+            it = os.scandir(pending.pop())
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                # Igual que rglob: no entrar en enlaces simbólicos a carpetas
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                    continue
+                try:
+                    if entry.is_file():
+                        total += entry.stat().st_size
+                except OSError:
+                    continue
+    return total
+
+def apply_permissions(path, parent_stat):
+    """Dar a path el dueño y modo del padre, solo si no los tiene ya"""
+    current = os.stat(path)
+    if (current.st_uid, current.st_gid) != (parent_stat.st_uid, parent_stat.st_gid):
+        os.chown(path, parent_stat.st_uid, parent_stat.st_gid)
+    if stat.S_IMODE(current.st_mode) != stat.S_IMODE(parent_stat.st_mode):
+        os.chmod(path, parent_stat.st_mode)
+
 def main():
     # Crear carpeta de duplicados
     os.makedirs(DUPLICATES_PATH, exist_ok=True)
     
     # Obtener permisos del directorio padre
     parent_stat = Path("/mnt/PROD/MEDIA").stat()
-    os.chown(DUPLICATES_PATH, parent_stat.st_uid, parent_stat.st_gid)
-    os.chmod(DUPLICATES_PATH, parent_stat.st_mode)
+    folder_mode = stat.S_IMODE(parent_stat.st_mode)
+    apply_permissions(DUPLICATES_PATH, parent_stat)
     
     print("🔍 Moviendo duplicados...")
     print("=" * 60)
     
+    # En el mismo sistema de archivos basta os.replace (un rename); si no, shutil copia y borra.
+    # Una carpeta montada aparte bajo MOVIES_PATH (bind mount, subvolumen) sigue cayendo en EXDEV
+    same_fs = (Path(MOVIES_PATH).exists() and
+               os.stat(MOVIES_PATH).st_dev == os.stat(DUPLICATES_PATH).st_dev)
+    mover = move_file if same_fs else shutil.move
+    
     moved_count = 0
+    # Carpetas de Duplicados tocadas; los permisos se ajustan una vez al final
+    dup_folders_used = set()
     
-    # Procesar películas con versiones duplicadas
-    for folder_name, criteria in DUPLICATES.items():
-        folder_path = Path(MOVIES_PATH) / folder_name
-        
-        if not folder_path.exists():
-            continue
-        
-        print(f"\n📦 {folder_name}")
-        
-        # Buscar archivos a mover
-        files_to_move = []
-        for file in folder_path.iterdir():
-            if file.is_file() and criteria["move"].lower() in file.name.lower():
-                files_to_move.append(file)
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        # Procesar películas con versiones duplicadas
+        for folder_name, criteria in DUPLICATES.items():
+            folder_path = Path(MOVIES_PATH) / folder_name
+            
+            if not folder_path.exists():
+                continue
+            
+            # La salida de cada carpeta se escribe de una vez al terminarla
+            lines = [f"\n📦 {folder_name}"]
+            
+            # Buscar archivos a mover
+            files_to_move = []
+            for file in folder_path.iterdir():
+                if file.is_file() and criteria["move"].lower() in file.name.lower():
+                    files_to_move.append(file)
+            
+            if files_to_move:
+                # Crear carpeta en Duplicados
+                dup_folder = Path(DUPLICATES_PATH) / folder_name
+                dup_folder.mkdir(mode=folder_mode, exist_ok=True)
+                dup_folders_used.add(dup_folder)
+                
+                # Mover archivos
+                moved, failed = move_files(executor, mover, files_to_move, dup_folder)
+                for file in moved:
+                    lines.append(f"   ✅ {file.name} → Duplicados")
+                    moved_count += 1
+                for file, error in failed:
+                    lines.append(f"   ❌ {file.name}: {error}")
+            
+            sys.stdout.write("\n".join(lines) + "\n")
         
-        if files_to_move:
+        # Mover carpetas completas
+        for folder_name in FULL_FOLDERS_TO_MOVE:
+            folder_path = Path(MOVIES_PATH) / folder_name
+            
+            if not folder_path.exists():
+                continue
+            
+            lines = [f"\n📁 {folder_name} (carpeta completa)"]
+            
             # Crear carpeta en Duplicados
             dup_folder = Path(DUPLICATES_PATH) / folder_name
-            dup_folder.mkdir(exist_ok=True)
+            dup_folder.mkdir(mode=folder_mode, exist_ok=True)
+            dup_folders_used.add(dup_folder)
             
-            # Mover archivos
-            for file in files_to_move:
-                dest = dup_folder / file.name
-                shutil.move(str(file), str(dest))
-                print(f"   ✅ {file.name} → Duplicados")
+            # Mover todos los archivos
+            files = [file for file in folder_path.iterdir() if file.is_file()]
+            moved, failed = move_files(executor, mover, files, dup_folder)
+            for file in moved:
+                lines.append(f"   ✅ {file.name}")
                 moved_count += 1
+            for file, error in failed:
+                lines.append(f"   ❌ {file.name}: {error}")
+            
+            # Eliminar carpeta vacía
+            try:
+                folder_path.rmdir()
+                lines.append(f"   🗑️  Carpeta vacía eliminada")
+            except:
+                pass
             
-            # Establecer permisos
-            os.chown(str(dup_folder), parent_stat.st_uid, parent_stat.st_gid)
-            os.chmod(str(dup_folder), parent_stat.st_mode)
+            sys.stdout.write("\n".join(lines) + "\n")
     
-    # Mover carpetas completas
-    for folder_name in FULL_FOLDERS_TO_MOVE:
-        folder_path = Path(MOVIES_PATH) / folder_name
-        
-        if not folder_path.exists():
-            continue
-        
-        print(f"\n📁 {folder_name} (carpeta completa)")
-        
-        # Crear carpeta en Duplicados
-        dup_folder = Path(DUPLICATES_PATH) / folder_name
-        dup_folder.mkdir(exist_ok=True)
-        
-        # Mover todos los archivos
-        for file in folder_path.iterdir():
-            if file.is_file():
-                dest = dup_folder / file.name
-                shutil.move(str(file), str(dest))
-                print(f"   ✅ {file.name}")
-                moved_count += 1
-        
-        # Eliminar carpeta vacía
-        try:
-            folder_path.rmdir()
-            print(f"   🗑️  Carpeta vacía eliminada")
-        except:
-            pass
-        
-        # Establecer permisos
-        os.chown(str(dup_folder), parent_stat.st_uid, parent_stat.st_gid)
-        os.chmod(str(dup_folder), parent_stat.st_mode)
+    # Establecer permisos
+    for dup_folder in dup_folders_used:
+        apply_permissions(dup_folder, parent_stat)
     
     print("\n" + "=" * 60)
     print(f"✅ Proceso completado")
@@ -131,11 +208,7 @@ def main():
     print(f"📁 Películas en Duplicados: {len(dup_folders)}")
     
     # Calcular espacio
-    total_size = 0
-    for folder in dup_folders:
-        for file in folder.rglob('*'):
-            if file.is_file():
-                total_size += file.stat().st_size
+    total_size = sum(dir_size(folder) for folder in dup_folders)
     
     size_gb = total_size / (1024**3)
     print(f"💾 Espacio en Duplicados: {size_gb:.2f} GB")
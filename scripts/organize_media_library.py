@@ -10,14 +10,65 @@ Estructura objetivo:
 
 import os
 import re
+import sys
+import stat
+import errno
 import shutil
+import bisect
 from pathlib import Path
 from datetime import datetime
 import json
 
 
+# Calidades y códecs a remover del título, unidos en una sola alternancia
+_PATTERNS_TO_REMOVE = (
+    r'\b(1080p|2160p|4K|720p|480p|UHD|HDR|HDR10|DV)\b',
+    r'\b(WEB-DL|BluRay|BDRip|REMUX|WEBRip|HDTS|BD|BDRIP)\b',
+    r'\b(DD5\.1|DDP5\.1|TrueHD|Atmos|AC3|AAC|5\.1|7\.1|2\.0)\b',
+    r'\b(H\.?264|H\.?265|x264|x265|HEVC)\b',
+    r'\b(DUAL|Latino|English|Español|Castellano|Multi|Subs?)\b',
+    r'\b(AMZN|NF|ATVP|APTV|DSNP|MA|HBO|ChileBT)\b',
+    r'\b(EXTENDED|UNRATED|Uncut|REMASTERED|IMAX|CLEAN|LINE|Full)\b',
+    r'-[A-Z]{2,}$',
+    r'\[.*?\]',
+)
+_CLEAN_RE = re.compile('|'.join(f'(?:{p})' for p in _PATTERNS_TO_REMOVE), re.IGNORECASE)
+_PUNCT_TABLE = str.maketrans('._-', '   ')
+_SPACES_RE = re.compile(r'\s+')
+
+# Caracteres no válidos en nombres de carpeta
+_INVALID_CHARS_TABLE = str.maketrans('', '', '<>:"/\\|?*')
+
+# Carpetas de temporada, mismos patrones que glob('[Ss]eason*'), glob('[Ss][0-9]*')
+# y glob('[Tt]emp*'), que distinguen mayúsculas
+_SEASON_RE = re.compile(r'[Ss]eason|[Ss][0-9]|[Tt]emp')
+
+# Metadata a simplificar al moverla, en orden de prioridad: (marca, nombre)
+_META_SUFFIXES = (
+    ('-poster', 'poster'),
+    ('-backdrop', 'backdrop'),
+    ('-landscape', 'backdrop'),
+    ('-logo', 'logo'),
+)
+
+# Patrones de año en orden de prioridad
+_YEAR_PATTERNS = tuple(re.compile(pattern) for pattern in (
+    r'\((\d{4})\)',
+    r'\.(\d{4})\.',
+    r'\s(\d{4})\s',
+    r'\.(\d{4})$',
+    r'\s(\d{4})$',
+))
+
+
+def _stem(name):
+    """Nombre sin extensión, con la misma regla que Path.stem."""
+    dot = name.rfind('.')
+    return name[:dot] if 0 < dot < len(name) - 1 else name
+
+
 class MediaLibraryOrganizer:
-    def __init__(self, movies_path, series_path, dry_run=True):
+    def __init__(self, movies_path, series_path, dry_run=True, operations_file=None):
         self.movies_path = Path(movies_path)
         self.series_path = Path(series_path)
         self.dry_run = dry_run
@@ -25,6 +76,16 @@ class MediaLibraryOrganizer:
         self.operations_log = []
         self.errors_log = []
         
+        # Con operations_file las operaciones se escriben en JSON Lines a medida
+        # que ocurren, en vez de acumularse en memoria para el reporte
+        self.operations_file = operations_file
+        self._operations_fp = None
+        self._operations_count = 0
+        
+        # Archivos de cada directorio (por ruta en texto) como (stem, orden, nombre),
+        # leídos una sola vez y ordenados por stem
+        self._dir_cache = {}
+        
         # Extensiones válidas
         self.video_extensions = ['.mkv', '.mp4', '.avi', '.m4v', '.mov']
         self.metadata_extensions = ['.jpg', '.jpeg', '.png', '.nfo', '.srt', '.sub', '.idx']
@@ -33,44 +94,25 @@ class MediaLibraryOrganizer:
         """Extrae y limpia el título de la película."""
         name = filename
         
-        # Remover extensión
+        # Remover extensión (solo al final del nombre)
         for ext in self.video_extensions:
-            name = name.replace(ext, '')
+            if name.endswith(ext):
+                name = name[:-len(ext)]
+                break
         
         # Remover calidades y códecs
-        patterns_to_remove = [
-            r'\b(1080p|2160p|4K|720p|480p|UHD|HDR|HDR10|DV)\b',
-            r'\b(WEB-DL|BluRay|BDRip|REMUX|WEBRip|HDTS|BD|BDRIP)\b',
-            r'\b(DD5\.1|DDP5\.1|TrueHD|Atmos|AC3|AAC|5\.1|7\.1|2\.0)\b',
-            r'\b(H\.?264|H\.?265|x264|x265|HEVC)\b',
-            r'\b(DUAL|Latino|English|Español|Castellano|Multi|Subs?)\b',
-            r'\b(AMZN|NF|ATVP|APTV|DSNP|MA|HBO|ChileBT)\b',
-            r'\b(EXTENDED|UNRATED|Uncut|REMASTERED|IMAX|CLEAN|LINE|Full)\b',
-            r'-[A-Z]{2,}$',
-            r'\[.*?\]',
-        ]
-        
-        for pattern in patterns_to_remove:
-            name = re.sub(pattern, '', name, flags=re.IGNORECASE)
+        name = _CLEAN_RE.sub('', name)
         
         # Limpiar caracteres
-        name = name.replace('.', ' ').replace('_', ' ').replace('-', ' ')
-        name = re.sub(r'\s+', ' ', name).strip()
+        name = name.translate(_PUNCT_TABLE)
+        name = _SPACES_RE.sub(' ', name).strip()
         
         return name
     
     def extract_year(self, filename):
         """Extrae el año de la película."""
-        year_patterns = [
-            r'\((\d{4})\)',
-            r'\.(\d{4})\.',
-            r'\s(\d{4})\s',
-            r'\.(\d{4})$',
-            r'\s(\d{4})$',
-        ]
-        
-        for pattern in year_patterns:
-            match = re.search(pattern, filename)
+        for pattern in _YEAR_PATTERNS:
+            match = pattern.search(filename)
             if match:
                 year = int(match.group(1))
                 if 1900 <= year <= 2030:
@@ -80,32 +122,125 @@ class MediaLibraryOrganizer:
     def create_movie_folder_name(self, title, year):
         """Crea el nombre de carpeta para una película."""
         # Limpiar título
-        clean_title = re.sub(r'[<>:"/\\|?*]', '', title)
+        clean_title = title.translate(_INVALID_CHARS_TABLE)
         clean_title = clean_title.strip()
         
         if year:
             return f"{clean_title} ({year})"
         return clean_title
     
-    def find_related_files(self, video_file):
-        """Encuentra archivos de metadata relacionados con la película."""
-        video_path = Path(video_file)
-        base_name = video_path.stem
-        parent_dir = video_path.parent
+    def metadata_target_name(self, related_file):
+        """Nombre simplificado de un archivo de metadata (titulo-poster.jpg → poster.jpg)."""
+        lower_name = related_file.name.lower()
+        for token, target in _META_SUFFIXES:
+            if token in lower_name:
+                return target + related_file.suffix
+        if related_file.suffix == '.nfo':
+            return 'movie.nfo'
+        return related_file.name
+    
+    def log_operation(self, operation):
+        """Registra una operación en memoria o en el archivo JSON Lines."""
+        self._operations_count += 1
+        if self.operations_file is None:
+            self.operations_log.append(operation)
+            return
         
-        related_files = []
+        if self._operations_fp is None:
+            # Solo el primer registro empieza el archivo; si se reabre tras
+            # close(), se agrega a lo ya escrito
+            mode = 'w' if self._operations_count == 1 else 'a'
+            self._operations_fp = open(self.operations_file, mode, encoding='utf-8')
+        self._operations_fp.write(json.dumps(operation, ensure_ascii=False) + '\n')
+        if self._operations_count % 1000 == 0:
+            self._operations_fp.flush()
+    
+    def close(self):
+        """Cierra el archivo de operaciones, escribiendo los registros pendientes."""
+        if self._operations_fp is not None:
+            self._operations_fp.close()
+            self._operations_fp = None
+    
+    def list_video_files(self, folder, names=None):
+        """Lista los archivos de video sueltos de una carpeta en una sola lectura.
+        
+        Devuelve las entradas os.DirEntry, sin crear un Path por archivo.
+        Si se pasa el conjunto names, se le agregan los nombres de todas las
+        entradas de la carpeta, aprovechando la misma lectura.
+        """
+        video_exts = tuple(self.video_extensions)
+        video_files = []
+        try:
+            with os.scandir(folder) as it:
+                for entry in it:
+                    if names is not None:
+                        names.add(entry.name)
+                    # Igual que Path.glob('*.ext'): terminación exacta, ocultos incluidos
+                    if entry.name.endswith(video_exts) and entry.is_file():
+                        video_files.append(entry)
+        except OSError:
+            pass  # glob tampoco fallaba con carpetas ilegibles
+        return video_files
+    
+    def _list_dir_files(self, parent_dir):
+        """Archivos de un directorio como (stem, orden, nombre), leído una sola vez.
+        
+        La lista queda ordenada por stem para buscar prefijos con bisect; orden
+        es la posición en la lectura original del directorio.
+        """
+        entries = self._dir_cache.get(parent_dir)
+        if entries is None:
+            with os.scandir(parent_dir) as it:
+                names = [entry.name for entry in it if entry.is_file()]
+            entries = sorted((_stem(name), order, name) for order, name in enumerate(names))
+            self._dir_cache[parent_dir] = entries
+        return entries
+    
+    def _forget_files(self, parent_dir, moved):
+        """Quita de la lista de un directorio los archivos que ya se movieron."""
+        entries = self._dir_cache.get(parent_dir)
+        if entries is None:
+            return
+        for moved_file in moved:
+            name = moved_file.name
+            stem = _stem(name)
+            # Solo se recorre el tramo de ese stem, sin reconstruir la lista
+            i = bisect.bisect_left(entries, (stem,))
+            while i < len(entries) and entries[i][0] == stem:
+                if entries[i][2] == name:
+                    del entries[i]
+                    break
+                i += 1
+    
+    def move_file(self, source, target):
+        """Mueve un archivo: rename directo y, solo entre discos, copia con shutil."""
+        try:
+            os.replace(source, target)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            shutil.move(source, target)
+    
+    def find_related_files(self, video_file):
+        """Encuentra archivos de metadata relacionados con la película (Path o os.DirEntry)."""
+        parent_dir, video_name = os.path.split(os.fspath(video_file))
+        base_name = _stem(video_name)
         
         # Buscar archivos con el mismo nombre base
-        for file in parent_dir.iterdir():
-            if file.is_file() and file != video_path:
-                file_stem = file.stem
-                
-                # Verificar si el archivo está relacionado
-                # Puede ser: nombre-poster.jpg, nombre-backdrop.jpg, etc.
-                if file_stem.startswith(base_name):
-                    related_files.append(file)
+        # Puede ser: nombre-poster.jpg, nombre-backdrop.jpg, etc.
+        # Los stems con ese prefijo son contiguos en la lista ordenada
+        entries = self._list_dir_files(parent_dir)
+        matches = []
+        for i in range(bisect.bisect_left(entries, (base_name,)), len(entries)):
+            stem, order, name = entries[i]
+            if not stem.startswith(base_name):
+                break
+            if name != video_name:
+                matches.append((order, name))
         
-        return related_files
+        # Mismo orden que la lectura del directorio
+        matches.sort()
+        return [Path(parent_dir, name) for order, name in matches]
     
     def organize_movies(self):
         """Organiza todas las películas en carpetas individuales."""
@@ -119,10 +254,21 @@ class MediaLibraryOrganizer:
             print(f"❌ Error: La ruta {self.movies_path} no existe")
             return
         
+        # Permisos del directorio padre: no cambian durante la ejecución
+        if not self.dry_run:
+            parent_stat = self.movies_path.stat()
+            parent_uid = parent_stat.st_uid
+            parent_gid = parent_stat.st_gid
+            parent_mode = parent_stat.st_mode
+            # Las carpetas nuevas salen siempre igual (mismo proceso, umask y
+            # ACL del padre): si la primera ya hereda dueño y modo, no hace
+            # falta chown/chmod en ninguna. None hasta crear la primera
+            inherits_permissions = None
+        
         # Buscar archivos de video sueltos
-        video_files = []
-        for ext in self.video_extensions:
-            video_files.extend(self.movies_path.glob(f'*{ext}'))
+        # (los nombres existentes evitan un stat por película más abajo)
+        existing_names = set()
+        video_files = self.list_video_files(self.movies_path, existing_names)
         
         print(f"📁 Archivos de video encontrados: {len(video_files)}")
         print()
@@ -131,16 +277,22 @@ class MediaLibraryOrganizer:
         skipped_count = 0
         error_count = 0
         
-        for video_file in sorted(video_files):
+        # Todas en la misma carpeta: ordenar por nombre da el mismo orden que
+        # comparar Paths, sin comparar sus partes
+        video_files.sort(key=lambda video_file: video_file.name)
+        
+        for video_file in video_files:
+            # La salida de cada película se escribe de una vez al terminarla
+            lines = []
             try:
                 # Extraer título y año
                 clean_title = self.clean_movie_title(video_file.name)
                 year = self.extract_year(video_file.name)
                 
                 if not year:
-                    print(f"⚠️  Sin año: {video_file.name}")
+                    lines.append(f"⚠️  Sin año: {video_file.name}")
                     self.errors_log.append({
-                        'file': str(video_file),
+                        'file': video_file.path,
                         'error': 'No se pudo extraer el año'
                     })
                     skipped_count += 1
@@ -151,24 +303,24 @@ class MediaLibraryOrganizer:
                 target_folder = self.movies_path / folder_name
                 
                 # Si la carpeta ya existe, puede ser que ya esté organizada
-                if target_folder.exists():
-                    print(f"⏭️  Ya existe: {folder_name}")
+                if folder_name in existing_names:
+                    lines.append(f"⏭️  Ya existe: {folder_name}")
                     skipped_count += 1
                     continue
                 
-                print(f"📦 {video_file.name}")
-                print(f"   → {folder_name}/")
+                lines.append(f"📦 {video_file.name}")
+                lines.append(f"   → {folder_name}/")
                 
                 # Buscar archivos relacionados
                 related_files = self.find_related_files(video_file)
                 
                 if related_files:
-                    print(f"   📎 Archivos relacionados: {len(related_files)}")
+                    lines.append(f"   📎 Archivos relacionados: {len(related_files)}")
                 
                 # Crear operación
                 operation = {
                     'type': 'movie',
-                    'source_video': str(video_file),
+                    'source_video': video_file.path,
                     'target_folder': str(target_folder),
                     'related_files': [str(f) for f in related_files],
                     'title': clean_title,
@@ -177,60 +329,61 @@ class MediaLibraryOrganizer:
                 
                 # Ejecutar o simular
                 if not self.dry_run:
-                    # Obtener permisos del directorio padre
-                    parent_stat = self.movies_path.stat()
-                    parent_uid = parent_stat.st_uid
-                    parent_gid = parent_stat.st_gid
-                    parent_mode = parent_stat.st_mode
-                    
                     # Crear carpeta
                     target_folder.mkdir(exist_ok=True)
+                    existing_names.add(folder_name)
+                    
+                    if inherits_permissions is None:
+                        folder_stat = target_folder.stat()
+                        inherits_permissions = (
+                            (folder_stat.st_uid, folder_stat.st_gid) == (parent_uid, parent_gid)
+                            and stat.S_IMODE(folder_stat.st_mode) == stat.S_IMODE(parent_mode)
+                        )
                     
                     # Establecer permisos y propietario igual que el directorio padre
-                    try:
-                        os.chown(str(target_folder), parent_uid, parent_gid)
-                        os.chmod(str(target_folder), parent_mode)
-                    except PermissionError:
-                        pass  # Si no hay permisos, continuar
+                    if not inherits_permissions:
+                        try:
+                            os.chown(str(target_folder), parent_uid, parent_gid)
+                            os.chmod(str(target_folder), parent_mode)
+                        except PermissionError:
+                            pass  # Si no hay permisos, continuar
                     
                     # Mover video
                     target_video = target_folder / video_file.name
-                    shutil.move(str(video_file), str(target_video))
+                    self.move_file(video_file.path, target_video)
                     
                     # Mover archivos relacionados
                     for related_file in related_files:
                         # Renombrar metadata para que sea más simple
-                        new_name = related_file.name
-                        
-                        # Simplificar nombres: titulo-poster.jpg → poster.jpg
-                        if '-poster' in new_name.lower():
-                            new_name = 'poster' + related_file.suffix
-                        elif '-backdrop' in new_name.lower() or '-landscape' in new_name.lower():
-                            new_name = 'backdrop' + related_file.suffix
-                        elif '-logo' in new_name.lower():
-                            new_name = 'logo' + related_file.suffix
-                        elif related_file.suffix == '.nfo':
-                            new_name = 'movie.nfo'
+                        new_name = self.metadata_target_name(related_file)
                         
                         target_related = target_folder / new_name
-                        shutil.move(str(related_file), str(target_related))
+                        self.move_file(related_file, target_related)
+                    
+                    # Ya no están en la carpeta de origen
+                    self._forget_files(os.path.dirname(video_file.path), [video_file] + related_files)
                     
-                    print(f"   ✅ Movida exitosamente")
+                    lines.append(f"   ✅ Movida exitosamente")
                 else:
-                    print(f"   🔵 Simulación - no se movió")
+                    lines.append(f"   🔵 Simulación - no se movió")
                 
-                self.operations_log.append(operation)
+                self.log_operation(operation)
                 organized_count += 1
-                print()
+                lines.append("")
                 
             except Exception as e:
-                print(f"   ❌ Error: {str(e)}")
+                # La carpeta de origen pudo quedar a medias: releerla
+                self._dir_cache.pop(str(self.movies_path), None)
+                lines.append(f"   ❌ Error: {str(e)}")
                 self.errors_log.append({
-                    'file': str(video_file),
+                    'file': video_file.path,
                     'error': str(e)
                 })
                 error_count += 1
-                print()
+                lines.append("")
+            finally:
+                if lines:
+                    sys.stdout.write('\n'.join(lines) + '\n')
         
         print("=" * 80)
         print("📊 RESUMEN - PELÍCULAS")
@@ -253,7 +406,8 @@ class MediaLibraryOrganizer:
             return
         
         # Listar todas las carpetas de series
-        series_folders = [f for f in self.series_path.iterdir() if f.is_dir()]
+        with os.scandir(self.series_path) as it:
+            series_folders = [entry for entry in it if entry.is_dir()]
         
         print(f"📁 Series encontradas: {len(series_folders)}")
         print()
@@ -261,33 +415,45 @@ class MediaLibraryOrganizer:
         well_organized = 0
         needs_organization = 0
         
-        for series_folder in sorted(series_folders):
+        series_folders.sort(key=lambda series_folder: series_folder.name)
+        video_exts = tuple(self.video_extensions)
+        
+        for series_folder in series_folders:
             print(f"📺 {series_folder.name}")
             
-            # Verificar si tiene estructura de temporadas
-            season_folders = list(series_folder.glob('[Ss]eason*')) + \
-                           list(series_folder.glob('[Ss][0-9]*')) + \
-                           list(series_folder.glob('[Tt]emp*'))
-            
-            # Buscar archivos de video en la raíz
-            video_files = []
-            for ext in self.video_extensions:
-                video_files.extend(series_folder.glob(f'*{ext}'))
+            # Una sola lectura de la carpeta: temporadas, videos sueltos y subcarpetas
+            season_count = 0
+            video_count = 0
+            subdirs = []
+            try:
+                with os.scandir(series_folder) as it:
+                    for entry in it:
+                        name = entry.name
+                        # Verificar si tiene estructura de temporadas (como el
+                        # glob anterior, cuenta cualquier entrada con ese nombre)
+                        if _SEASON_RE.match(name):
+                            season_count += 1
+                        if entry.is_dir():
+                            subdirs.append(name)
+                        # Buscar archivos de video en la raíz
+                        elif name.endswith(video_exts) and entry.is_file():
+                            video_count += 1
+            except OSError:
+                pass
             
-            if season_folders:
-                print(f"   ✅ Ya tiene {len(season_folders)} temporada(s) organizadas")
+            if season_count:
+                print(f"   ✅ Ya tiene {season_count} temporada(s) organizadas")
                 well_organized += 1
-            elif video_files:
-                print(f"   ⚠️  Archivos sueltos: {len(video_files)}")
+            elif video_count:
+                print(f"   ⚠️  Archivos sueltos: {video_count}")
                 print(f"   💡 Requiere organización manual por temporadas")
                 needs_organization += 1
             else:
                 # Verificar si tiene subcarpetas que podrían ser temporadas
-                subdirs = [d for d in series_folder.iterdir() if d.is_dir()]
                 if subdirs:
                     print(f"   📂 Contiene {len(subdirs)} subcarpeta(s):")
                     for subdir in subdirs[:3]:  # Mostrar solo las primeras 3
-                        print(f"      - {subdir.name}")
+                        print(f"      - {subdir}")
                     if len(subdirs) > 3:
                         print(f"      ... y {len(subdirs) - 3} más")
                     well_organized += 1
@@ -310,12 +476,21 @@ class MediaLibraryOrganizer:
             'dry_run': self.dry_run,
             'movies_path': str(self.movies_path),
             'series_path': str(self.series_path),
-            'operations': self.operations_log,
-            'errors': self.errors_log,
-            'summary': {
-                'total_operations': len(self.operations_log),
-                'total_errors': len(self.errors_log)
-            }
+        }
+        
+        if self.operations_file is None:
+            report['operations'] = self.operations_log
+        else:
+            # Las operaciones ya están en disco: el reporte solo las referencia
+            self.close()
+            if not self._operations_count:
+                open(self.operations_file, 'w').close()  # Sin operaciones: archivo vacío
+            report['operations_file'] = str(Path(self.operations_file).absolute())
+        
+        report['errors'] = self.errors_log
+        report['summary'] = {
+            'total_operations': self._operations_count,
+            'total_errors': len(self.errors_log)
         }
         
         output_path = Path(output_file)
@@ -330,6 +505,7 @@ def main():
     # Configuración
     MOVIES_PATH = "/mnt/PROD/MEDIA/Downloads/Movies"
     SERIES_PATH = "/mnt/PROD/MEDIA/Downloads/Series"
+    OPERATIONS_FILE = None  # p. ej. 'media_organization_ops.jsonl' en bibliotecas muy grandes
     
     print("=" * 80)
     print("🎬📺 ORGANIZADOR DE BIBLIOTECA MULTIMEDIA")
@@ -337,7 +513,6 @@ def main():
     print()
     
     # Modo de ejecución
-    import sys
     dry_run = True
     
     if len(sys.argv) > 1 and sys.argv[1] == '--execute':
@@ -357,16 +532,21 @@ def main():
         print()
     
     # Crear organizador
-    organizer = MediaLibraryOrganizer(MOVIES_PATH, SERIES_PATH, dry_run=dry_run)
-    
-    # Organizar películas
-    organizer.organize_movies()
-    
-    # Organizar series
-    organizer.organize_series()
+    organizer = MediaLibraryOrganizer(MOVIES_PATH, SERIES_PATH, dry_run=dry_run,
+                                      operations_file=OPERATIONS_FILE)
     
-    # Generar reporte
-    organizer.generate_report('media_organization_report.json')
+    try:
+        # Organizar películas
+        organizer.organize_movies()
+        
+        # Organizar series
+        organizer.organize_series()
+        
+        # Generar reporte
+        organizer.generate_report('media_organization_report.json')
+    finally:
+        # Ante un error o Ctrl+C, no perder las operaciones ya registradas
+        organizer.close()
     
     print("=" * 80)
     print("✅ PROCESO COMPLETADO")
@@ -0,0 +1,264 @@
+"""
+Pruebas de MediaOrganizerAutomated (scripts/auto_organizer.py).
+
+Ejecutar con: python -m unittest discover -s tests
+"""
+
+import gc
+import os
+import re
+import sys
+import weakref
+import random
+import hashlib
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import yaml
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'scripts'))
+
+import auto_organizer  # noqa: E402
+
+
+def make_organizer(directory, log_file=None, **settings):
+    """Crea un organizador con una configuración mínima en directory"""
+    config = {
+        'directories': {},
+        'settings': {
+            'dry_run': True,
+            'min_file_size_mb': 0,
+            'video_extensions': ['.mkv', '.mp4'],
+            'metadata_extensions': ['.srt', '.nfo'],
+            **settings,
+        },
+        'logging': {'enabled': False} if log_file is None else {'log_file': str(log_file)},
+    }
+    config_path = Path(directory) / 'config.yaml'
+    config_path.write_text(yaml.safe_dump(config))
+    return auto_organizer.MediaOrganizerAutomated(str(config_path))
+
+
+class FileHashTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def write(self, name, data):
+        path = self.tmp / name
+        path.write_bytes(data)
+        return path
+
+    def test_hashlib_algorithm(self):
+        organizer = make_organizer(self.tmp, duplicates={'hash_algo': 'md5'})
+        path = self.write('a.mkv', b'contenido' * 1000)
+        self.assertEqual(organizer.get_file_hash(path),
+                         hashlib.md5(path.read_bytes()).hexdigest())
+
+    def test_xxh3_falls_back_to_blake2b(self):
+        organizer = make_organizer(self.tmp)
+        path = self.write('a.mkv', b'contenido' * 1000)
+        with mock.patch.object(auto_organizer, 'xxhash', None), \
+                mock.patch.object(auto_organizer, 'blake3', None):
+            digest = organizer.get_file_hash(path)
+        self.assertEqual(digest, hashlib.blake2b(path.read_bytes()).hexdigest())
+
+    def test_empty_file(self):
+        organizer = make_organizer(self.tmp)
+        path = self.write('a.mkv', b'')
+        self.assertEqual(organizer.get_file_hash(path), organizer.get_file_hash(path))
+
+    def test_cache_hit(self):
+        organizer = make_organizer(self.tmp)
+        path = self.write('a.mkv', b'x' * 100)
+        with mock.patch.object(organizer, '_compute_file_hash',
+                               wraps=organizer._compute_file_hash) as compute:
+            first = organizer.get_file_hash(path)
+            second = organizer.get_file_hash(path)
+        self.assertEqual(first, second)
+        self.assertEqual(compute.call_count, 1)
+
+    def test_cache_invalidated_by_mtime(self):
+        organizer = make_organizer(self.tmp, duplicates={'hash_algo': 'md5'})
+        path = self.write('a.mkv', b'a' * 100)
+        os.utime(path, ns=(1_000_000_000, 1_000_000_000))
+        first = organizer.get_file_hash(path)
+
+        # Mismo tamaño y contenido distinto: solo cambia el mtime
+        path.write_bytes(b'b' * 100)
+        os.utime(path, ns=(2_000_000_000, 2_000_000_000))
+        second = organizer.get_file_hash(path)
+
+        self.assertNotEqual(first, second)
+        self.assertEqual(second, hashlib.md5(b'b' * 100).hexdigest())
+
+    def test_cache_cleared_per_run(self):
+        organizer = make_organizer(self.tmp)
+        path = self.write('a.mkv', b'x' * 100)
+        organizer.get_file_hash(path)
+        organizer.run()
+        self.assertEqual(organizer._hash_cache, {})
+
+    def test_quick_mode_reads_head_and_tail(self):
+        organizer = make_organizer(self.tmp)
+        a = self.write('a.mkv', b'H' * 4 + b'1' * 10 + b'T' * 4)
+        b = self.write('b.mkv', b'H' * 4 + b'2' * 10 + b'T' * 4)
+        c = self.write('c.mkv', b'H' * 4 + b'1' * 10 + b'X' * 4)
+        with mock.patch.object(auto_organizer, 'QUICK_HASH_SPAN', 4):
+            quick_a = organizer.get_file_hash(a, mode='quick')
+            quick_b = organizer.get_file_hash(b, mode='quick')
+            quick_c = organizer.get_file_hash(c, mode='quick')
+
+        # El centro no se lee en modo quick; el final sí
+        self.assertEqual(quick_a, quick_b)
+        self.assertNotEqual(quick_a, quick_c)
+        self.assertNotEqual(organizer.get_file_hash(a), organizer.get_file_hash(b))
+
+    def test_quick_mode_includes_size(self):
+        organizer = make_organizer(self.tmp)
+        a = self.write('a.mkv', b'x' * 8)
+        b = self.write('b.mkv', b'x' * 9)
+        with mock.patch.object(auto_organizer, 'QUICK_HASH_SPAN', 4):
+            self.assertNotEqual(organizer.get_file_hash(a, mode='quick'),
+                                organizer.get_file_hash(b, mode='quick'))
+
+    def test_find_duplicate_files(self):
+        organizer = make_organizer(self.tmp)
+        a = self.write('a.mkv', b'H' * 4 + b'1' * 10 + b'T' * 4)
+        b = self.write('b.mkv', b'H' * 4 + b'1' * 10 + b'T' * 4)
+        c = self.write('c.mkv', b'H' * 4 + b'2' * 10 + b'T' * 4)
+        d = self.write('d.mkv', b'unico')
+        with mock.patch.object(auto_organizer, 'QUICK_HASH_SPAN', 4):
+            groups = organizer.find_duplicate_files([a, b, c, d])
+        self.assertEqual([sorted(group) for group in groups], [[a, b]])
+
+
+def clean(name, sequential=False):
+    """clean_title con la alternancia unida o, con sequential, patrón a patrón"""
+    auto_organizer._clean_title.cache_clear()
+    with mock.patch.object(auto_organizer, '_DEBUG_REGEX', sequential):
+        try:
+            return auto_organizer._clean_title(name, ('.mkv', '.mp4'))
+        finally:
+            auto_organizer._clean_title.cache_clear()
+
+
+class CleanTitleTest(unittest.TestCase):
+    # Paréntesis de release: la alternancia los quita enteros, el bucle
+    # secuencial solo su contenido (las etiquetas se van antes)
+    RELEASE_GROUP = re.compile(r'\([^()]*?(Blu-?ray|WEB|REMUX)[^()]*\)', re.IGNORECASE)
+
+    TOKENS = (
+        "The Matrix Mad Max Dune Mañana Subí Black and Chrome 1999 2021 "
+        "1080p 4K HDR WEB WEB-DL BluRay Blu-ray REMUX Remux DD5.1 x264 "
+        "DUAL Latino MA Subs (2010) (Spanish) ( ) [YTS] -GRP"
+    ).split()
+
+    def test_release_group_stays_inside_parentheses(self):
+        self.assertEqual(clean("Mad Max (2015) Black and Chrome (BluRay)"),
+                         "Mad Max (2015) Black and Chrome")
+        self.assertEqual(clean("Alien (1979) Directors Cut (Remux)"), "Alien (1979)")
+        self.assertEqual(clean("Dune (2021) (Spanish) (WEB-DL)"), "Dune (2021) (Spanish)")
+        self.assertEqual(clean("Up (2009) Extended (WEB)"), "Up (2009)")
+
+    def test_parity_with_sequential_patterns(self):
+        rng = random.Random(7)
+        for _ in range(5000):
+            name = ''.join(
+                rng.choice(self.TOKENS) + rng.choice('. -')
+                for _ in range(rng.randint(1, 9))
+            )
+            expected = clean(self.RELEASE_GROUP.sub('', name), sequential=True)
+            self.assertEqual(clean(name), expected, name)
+
+
+class CleanTitleRE2Test(unittest.TestCase):
+    # Con re.ASCII, \b se comporta como en RE2: sirve de sustituto cuando
+    # google-re2 no está instalado
+    ASCII_RE = re.compile(auto_organizer._CLEAN_EXPR, re.IGNORECASE | re.ASCII)
+
+    NAMES = (
+        "Mañana.2020.1080p.WEB-DL",
+        "Subí.al.cielo.2019.DUAL",
+        "Él.Mañana (2018) Subs [YTS]",
+        "The.Matrix.1999.1080p.BluRay.x264-GROUP",
+        "Dune (2021) (Spanish) (WEB-DL)",
+    )
+
+    def test_engine_does_not_change_titles(self):
+        expected = [clean(name) for name in self.NAMES]
+        with mock.patch.object(auto_organizer, '_CLEAN_RE2', self.ASCII_RE):
+            self.assertEqual([clean(name) for name in self.NAMES], expected)
+        self.assertEqual(expected[0], "Mañana 2020")
+        self.assertEqual(expected[1], "Subí al cielo 2019")
+
+    def test_ascii_engine_only_for_ascii_names(self):
+        engine = mock.Mock(wraps=self.ASCII_RE)
+        with mock.patch.object(auto_organizer, '_CLEAN_RE2', engine):
+            clean("The.Matrix.1999.1080p")
+            clean("Mañana.2020.1080p")
+        self.assertEqual([call.args[1] for call in engine.sub.call_args_list],
+                         ["The.Matrix.1999.1080p"])
+
+    @unittest.skipUnless(auto_organizer.re2, "google-re2 no instalado")
+    def test_re2_parity_on_ascii_names(self):
+        rng = random.Random(3)
+        tokens = [token for token in CleanTitleTest.TOKENS if token.isascii()]
+        for _ in range(2000):
+            name = ''.join(rng.choice(tokens) + rng.choice('. -') for _ in range(rng.randint(1, 9)))
+            self.assertEqual(auto_organizer._CLEAN_RE2.sub('', name),
+                             auto_organizer._CLEAN_RE.sub('', name), name)
+
+
+class LoggingTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+        self.log_file = self.tmp / 'organizer.log'
+
+    def tearDown(self):
+        logger = auto_organizer.logging.getLogger('MediaOrganizer')
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        self._tmp.cleanup()
+
+    def test_run_again_after_close(self):
+        organizer = make_organizer(self.tmp, self.log_file)
+        organizer.run()
+        organizer.close()
+        organizer.run()
+        organizer.close()
+        self.assertEqual(self.log_file.read_text().count('Iniciando'), 2)
+
+    def test_close_releases_instance(self):
+        organizer = make_organizer(self.tmp, self.log_file)
+        ref = weakref.ref(organizer)
+        organizer.close()
+        del organizer
+        gc.collect()
+        self.assertIsNone(ref())
+
+
+class ValidVideoTest(unittest.TestCase):
+    def test_extension_and_size(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            organizer = make_organizer(tmp, min_file_size_mb=1)
+            big = Path(tmp) / 'Movie.2020.MKV'
+            big.write_bytes(b'x' * (1024 * 1024))
+            small = Path(tmp) / 'Movie.2021.mkv'
+            small.write_bytes(b'x')
+            other = Path(tmp) / 'Movie.2020.srt'
+            other.write_bytes(b'x' * (1024 * 1024))
+
+            self.assertTrue(organizer.is_valid_video(big))
+            self.assertFalse(organizer.is_valid_video(small))
+            self.assertFalse(organizer.is_valid_video(other))
+
+
+if __name__ == '__main__':
+    unittest.main()
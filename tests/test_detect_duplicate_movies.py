@@ -0,0 +1,51 @@
+"""
+Pruebas de MovieDuplicateDetector (scripts/detect_duplicate_movies.py).
+
+Ejecutar con: python -m unittest discover -s tests
+"""
+
+import io
+import sys
+import unittest
+import contextlib
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'scripts'))
+
+import detect_duplicate_movies  # noqa: E402
+
+
+def detector_with(titles, threshold=90):
+    """Detector con una copia por título (todas del año 2021), sin escanear disco"""
+    detector = detect_duplicate_movies.MovieDuplicateDetector('/no/existe', fuzzy_threshold=threshold)
+    for title in titles:
+        detector.movies_db[(title, 2021)].append({'path': f'/movies/{title}.mkv'})
+    return detector
+
+
+def merged_keys(detector):
+    with contextlib.redirect_stdout(io.StringIO()):
+        detector.merge_similar_titles()
+    return sorted(detector.duplicate_keys)
+
+
+@unittest.skipUnless(detect_duplicate_movies.process, "rapidfuzz no instalado")
+class MergeSimilarTitlesTest(unittest.TestCase):
+    def test_subset_titles_are_not_merged(self):
+        for titles in (["dune", "dune part two"], ["it", "it follows"], ["dune", "dune part one"]):
+            detector = detector_with(titles, threshold=50)
+            self.assertEqual(merged_keys(detector), [], titles)
+            self.assertEqual(len(detector.movies_db), 2)
+
+    def test_reordered_and_near_titles_are_merged(self):
+        detector = detector_with(["matrix the", "the matrix"])
+        self.assertEqual(merged_keys(detector), [("matrix the", 2021)])
+        self.assertEqual(len(detector.movies_db[("matrix the", 2021)]), 2)
+
+        detector = detector_with(["harry potter and the sorcerers stone",
+                                  "harry potter and the sorcerer s stone"])
+        self.assertEqual(len(merged_keys(detector)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()